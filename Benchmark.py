@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Packing Santa's Sleigh -- Benchmark
+Times the solvers and the metric on seeded synthetic present sets, saves the
+results to JSON and compares them with a previous run.
+
+Each solver runs as a script, like from the command line, in a directory with
+the generated presents.csv (and presents_revorder.csv for SampleSubmission);
+MetricCalculation checks the submission of TopDown.
+
+Usage: python Benchmark.py [--sizes 10000 100000] [--solvers TopDown MetricCalculation]
+                           [--output benchmark.json] [--baseline old.json --max-regression 0.2]
+Exits with status 1 if a script fails or if the throughput (presents per second)
+of a solver falls by more than max-regression with respect to the baseline.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import platform
+import subprocess
+
+import numpy as np
+
+SIZES = [10000, 100000, 1000000, 10000000]
+SOLVERS = ['SampleSubmission', 'TopDown', 'TopDownSmart', 'TopDownBetter',
+           'TopDownOffline', 'TopDownGravity', 'MetricCalculation']
+# (probability, largest dimension) of the presents: many small presents, some
+# medium ones and a few large ones, all dimensions at least 2
+PRESENT_MIX = [(0.5, 10), (0.3, 70), (0.2, 250)]
+METRIC_SUBMISSION = 'topdown.csv' # written by TopDown
+# arguments of the scripts: TopDownOffline stops after MAX_LAYERS layers without writing by default
+SOLVER_ARGS = {'TopDownOffline': ['--max-layers', '0', '--write'],
+               'MetricCalculation': [METRIC_SUBMISSION]}
+REPO = os.path.dirname(os.path.abspath(__file__))
+
+
+def generate_presents(n, seed):
+    """ Array (n, 4) of PresentId and dimensions drawn from PRESENT_MIX """
+    random = np.random.RandomState(seed)
+    probabilities = np.array([p for p, _ in PRESENT_MIX])
+    largest = np.array([d for _, d in PRESENT_MIX])[random.choice(len(PRESENT_MIX), n, p=probabilities)]
+    presents = np.empty((n, 4), dtype=np.int32)
+    presents[:, 0] = np.arange(1, n + 1)
+    for k in xrange(1, 4):
+        presents[:, k] = 2 + (random.random_sample(n) * (largest - 1)).astype(np.int32)
+    return presents
+
+def write_presents(filename, presents):
+    with open(filename, 'wb') as f:
+        f.write('PresentId,Dimension1,Dimension2,Dimension3\n')
+        np.savetxt(f, presents, fmt='%d', delimiter=',')
+
+def prepare(workdir, n, seed):
+    """ Directory with presents.csv and presents_revorder.csv of n presents """
+    directory = os.path.join(workdir, '%d_%d' % (n, seed))
+    if not os.path.exists(os.path.join(directory, 'presents_revorder.csv')):
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        presents = generate_presents(n, seed)
+        write_presents(os.path.join(directory, 'presents.csv'), presents)
+        write_presents(os.path.join(directory, 'presents_revorder.csv'), presents[::-1])
+    return directory
+
+def run_script(directory, solver):
+    """ Runs solver.py in directory, returns the wall time in seconds, or None if it fails """
+    command = [sys.executable, os.path.join(REPO, solver + '.py')] + SOLVER_ARGS.get(solver, [])
+    env = dict(os.environ, MPLBACKEND='Agg') # TopDownSmart plots
+    start = time.time()
+    with open(os.path.join(directory, solver + '.log'), 'wb') as log:
+        status = subprocess.call(command, cwd=directory, stdout=log, stderr=subprocess.STDOUT, env=env)
+    seconds = time.time() - start
+    if status != 0:
+        print solver + ' failed:'
+        with open(os.path.join(directory, solver + '.log'), 'rb') as log:
+            print ''.join(log.readlines()[-5:])
+        return None
+    return seconds
+
+def run_benchmark(sizes, solvers, seed, workdir):
+    results = []
+    for n in sizes:
+        directory = prepare(workdir, n, seed)
+        for solver in solvers:
+            if solver == 'MetricCalculation' and not os.path.exists(os.path.join(directory, METRIC_SUBMISSION)):
+                run_script(directory, 'TopDown')
+            seconds = run_script(directory, solver)
+            result = {'solver': solver, 'presents': n, 'seconds': seconds,
+                      'throughput': n / seconds if seconds else None}
+            if seconds is None:
+                print '%-18s %9d presents  failed' % (solver, n)
+            else:
+                print '%-18s %9d presents %10.2f s %12.0f presents/s' % (solver, n, seconds, n / seconds)
+            results.append(result)
+    return results
+
+def find_regressions(results, baseline, maxRegression):
+    """ Results whose throughput is below (1 - maxRegression) times the one of the
+    same solver and size in the baseline results, as (result, baseline throughput).
+    """
+    previous = dict(((r['solver'], r['presents']), r['throughput']) for r in baseline
+                    if r['throughput'] is not None)
+    regressions = []
+    for r in results:
+        before = previous.get((r['solver'], r['presents']))
+        if before is not None and r['throughput'] is not None and \
+                r['throughput'] < (1 - maxRegression) * before:
+            regressions.append((r, before))
+    return regressions
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Packing Santa's Sleigh -- Benchmark")
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES[:1],
+                        help='numbers of presents (default %d; the full suite is %s)'
+                        % (SIZES[0], ' '.join(str(n) for n in SIZES)))
+    parser.add_argument('--solvers', nargs='+', default=SOLVERS, choices=SOLVERS,
+                        help='scripts to time (default all)')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the present generator')
+    parser.add_argument('--workdir', help='directory for the generated presents and the outputs, '
+                        'kept between runs (default: temporary)')
+    parser.add_argument('--output', default='benchmark.json', help='JSON file of the results')
+    parser.add_argument('--baseline', help='JSON file of a previous run to compare with')
+    parser.add_argument('--max-regression', type=float, default=0.2,
+                        help='largest accepted relative throughput loss with respect to the baseline')
+    args = parser.parse_args()
+
+    workdir = args.workdir or tempfile.mkdtemp()
+    try:
+        results = run_benchmark(args.sizes, args.solvers, args.seed, workdir)
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir)
+
+    with open(args.output, 'wb') as f:
+        json.dump({'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+                   'python': platform.python_version(),
+                   'machine': platform.platform(),
+                   'seed': args.seed,
+                   'results': results}, f, indent=1)
+    print 'Results written to ' + args.output
+
+    failed = [r for r in results if r['seconds'] is None]
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'rb') as f:
+            regressions = find_regressions(results, json.load(f)['results'], args.max_regression)
+        for r, before in regressions:
+            print 'Throughput regression: %s on %d presents, %.0f presents/s (was %.0f)' \
+                % (r['solver'], r['presents'], r['throughput'], before)
+    if failed or regressions:
+        sys.exit(1)
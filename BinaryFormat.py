@@ -0,0 +1,121 @@
+# -*- coding: utf-8 -*-
+"""
+Packing Santa's Sleigh -- Binary presents and submission files
+Fixed-width binary versions of presents.csv and of a submission csv, stored as
+.npy files so that they load as memory-mapped numpy arrays: loading is instant,
+and processes opening the same file share the same pages.
+- presents: int16 x 3 per present (the dimensions), row i is PresentId i+1
+- placements: one record per present, PresentId and min/max corners
+  (int16 for x and y, int32 for z)
+
+Usage: python BinaryFormat.py presents.csv [presents.npy]
+       python BinaryFormat.py submission.csv [submission.npy]
+"""
+
+import os
+import sys
+
+import numpy as np
+
+import Formats
+import SubmissionWriter
+
+PLACEMENT_DTYPE = np.dtype([('id', '<i4'),
+                            ('x1', '<i2'), ('y1', '<i2'), ('z1', '<i4'),
+                            ('x2', '<i2'), ('y2', '<i2'), ('z2', '<i4')])
+
+
+def convert_presents(csvFilename, npyFilename):
+    """ Writes the binary version of presents.csv.
+    Present ids must be 1..N in order, since they are not stored.
+    """
+    presents = Formats.read_int_csv(csvFilename, 4)
+    if not (presents[:, 0] == np.arange(1, len(presents) + 1)).all():
+        print 'PresentIds of ' + csvFilename + ' must be 1..N in order'
+        exit()
+    if presents[:, 1:].min() < 1 or presents[:, 1:].max() > np.iinfo(np.int16).max:
+        print 'Dimensions of ' + csvFilename + ' do not fit in int16'
+        exit()
+    np.save(npyFilename, presents[:, 1:].astype('<i2'))
+
+def convert_submission(csvFilename, npyFilename):
+    """ Writes the binary version of a submission: the 8 vertices of each package
+    are replaced by its min and max corners.
+    """
+    submission = Formats.read_int_csv(csvFilename, 25)
+    bounds, valid = Formats.getPackageBounds(submission[:, 1:])
+    if not valid.all():
+        print 'Error with submitted package vertices of present ' + \
+            str(submission[np.flatnonzero(~valid)[0], 0])
+        exit()
+    xy = bounds[:, :4]
+    if xy.min() < np.iinfo(np.int16).min or xy.max() > np.iinfo(np.int16).max:
+        print 'x, y coordinates of ' + csvFilename + ' do not fit in int16'
+        exit()
+    placements = np.empty(len(submission), dtype=PLACEMENT_DTYPE)
+    placements['id'] = submission[:, 0]
+    for k, name in enumerate(['x1', 'x2', 'y1', 'y2', 'z1', 'z2']):
+        placements[name] = bounds[:, k]
+    np.save(npyFilename, placements)
+
+def load_presents(npyFilename):
+    """ Memory-maps the binary presents file: array of shape (N, 3), int16. """
+    return np.load(npyFilename, mmap_mode='r')
+
+def load_placements(npyFilename):
+    """ Memory-maps the binary submission file: array of PLACEMENT_DTYPE records. """
+    return np.load(npyFilename, mmap_mode='r')
+
+def presents_array(presents):
+    """ Array of shape (N, 4) with PresentId and dimensions, as read from presents.csv. """
+    return np.column_stack((np.arange(1, len(presents) + 1), presents)).astype(np.int64)
+
+def placements_bounds(placements):
+    """ Returns the present ids and the bounds (MinX, MaxX, MinY, MaxY, MinZ, MaxZ)
+    of the placements, as int64 arrays.
+    """
+    bounds = np.column_stack([placements[name] for name in ['x1', 'x2', 'y1', 'y2', 'z1', 'z2']])
+    return placements['id'].astype(np.int64), bounds.astype(np.int64)
+
+def placements_submission(placements):
+    """ Array of shape (N, 25) with the rows of the submission csv, using the
+    vertex convention of SubmissionWriter.vertices.
+    """
+    presentIds, bounds = placements_bounds(placements)
+    return SubmissionWriter.vertices(presentIds, *bounds.T)
+
+def iter_presents_chunks(presents, chunkRows):
+    """ Yields presents_array of consecutive slices of at most chunkRows presents. """
+    for start in xrange(0, len(presents), chunkRows):
+        rows = presents_array(presents[start:start + chunkRows])
+        rows[:, 0] += start
+        yield rows
+
+def iter_submission_chunks(placements, chunkRows):
+    """ Yields placements_submission of consecutive slices of at most chunkRows placements. """
+    for start in xrange(0, len(placements), chunkRows):
+        yield placements_submission(placements[start:start + chunkRows])
+
+
+if __name__ == "__main__":
+
+    if len(sys.argv) <= 1:
+        print "One argument is required (name of presents or submission csv)"
+        exit()
+
+    csvFilename = sys.argv[1]
+    if len(sys.argv) > 2:
+        npyFilename = sys.argv[2]
+    else:
+        npyFilename = os.path.splitext(csvFilename)[0] + '.npy'
+
+    with open(csvFilename, 'rb') as f:
+        ncols = len(f.readline().split(','))
+    if ncols == 4:
+        convert_presents(csvFilename, npyFilename)
+    elif ncols == 25:
+        convert_submission(csvFilename, npyFilename)
+    else:
+        print 'Unknown file format: ' + csvFilename
+        exit()
+    print 'Wrote ' + npyFilename
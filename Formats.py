@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Packing Santa's Sleigh -- File formats
+Integer csv files read into numpy arrays in one call, and the bounds of the
+packages of a submission, shared by the metric, the loaders and the converters.
+"""
+
+import itertools
+
+import numpy as np
+
+
+def parse_int_csv(data, ncols, filename, dtype=np.int64):
+    """ Parse csv lines of integers into an array of shape (number of rows, ncols). """
+    data = data.replace('\r', '').strip().replace('\n', ',')
+    values = np.fromstring(data, dtype=dtype, sep=',')
+    if values.size % ncols != 0:
+        print 'Error reading ' + filename + ': expected ' + str(ncols) + ' columns'
+        exit()
+    return values.reshape(-1, ncols)
+
+def read_int_csv(filename, ncols, dtype=np.int64):
+    """ Read a csv file of integers (with one header line) into a 2D array
+    in one go, instead of going through csv.reader and int() per field.
+    Arguments:
+        filename: name of the csv file
+        ncols: number of columns of the file
+        dtype: integer type of the array
+    Returns:
+        numpy array of shape (number of rows, ncols)
+    """
+    with open(filename, 'rb') as f:
+        f.readline() # header
+        data = f.read()
+    return parse_int_csv(data, ncols, filename, dtype)
+
+def iter_int_csv_chunks(filename, ncols, chunkRows):
+    """ Same as read_int_csv, but yields arrays of at most chunkRows rows. """
+    with open(filename, 'rb') as f:
+        f.readline() # header
+        while True:
+            lines = list(itertools.islice(f, chunkRows))
+            if not lines:
+                break
+            yield parse_int_csv(''.join(lines), ncols, filename)
+
+def getPackageBounds(vertices):
+    """ Columnar version of Present.set_submitted_package_dimensions.
+    Arguments:
+        vertices: array of shape (N, 24), the 8 vertices of each package
+    Returns:
+        bounds: array of shape (N, 6): MinX, MaxX, MinY, MaxY, MinZ, MaxZ
+        valid: boolean array, True if the package has exactly 2 values
+            for each of x, y, z
+    """
+    bounds = np.empty((len(vertices), 6), dtype=np.int64)
+    valid = np.ones(len(vertices), dtype=bool)
+    for axis in xrange(3):
+        values = vertices[:, axis::3]
+        amin = values.min(axis=1)
+        amax = values.max(axis=1)
+        bounds[:, 2*axis] = amin
+        bounds[:, 2*axis + 1] = amax
+        valid &= (amin != amax)
+        valid &= ((values == amin[:, None]) | (values == amax[:, None])).all(axis=1)
+    return bounds, valid
@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""
+Packing Santa's Sleigh -- Incremental Metric
+Keeps the metric of a valid submission up to date while single presents are
+moved, for local search over submissions:
+
+    metric = IncrementalMetric.from_files('presents.csv', 'submission.csv')
+    newMetric = metric.move(presentId, (MinX, MaxX, MinY, MaxY, MinZ, MaxZ))
+    if newMetric is None or newMetric >= best:
+        metric.rollback()
+    else:
+        metric.commit()
+
+The presents are kept in the sweep order of MetricCalculation (by -MaxZ, then
+PresentId) in a sorted key array, with the running order term, and in a 3D grid
+so that a moved present is only checked against its neighbours.
+A move costs O(log n + neighbours + number of presents it moves past in the order).
+"""
+
+import numpy as np
+
+import MetricCalculation
+
+
+class PresentsGrid:
+    """ All the presents of the sleigh, indexed by a uniform 3D grid. """
+    CELL_SIZE = 50
+
+    def __init__(self):
+        self.cells = {}
+
+    def cells_of(self, box):
+        size = self.CELL_SIZE
+        return [(i, j, k)
+                for i in xrange((box[0] - 1) // size, (box[1] - 1) // size + 1)
+                for j in xrange((box[2] - 1) // size, (box[3] - 1) // size + 1)
+                for k in xrange((box[4] - 1) // size, (box[5] - 1) // size + 1)]
+
+    def add(self, presentId, box):
+        for cell in self.cells_of(box):
+            self.cells.setdefault(cell, set()).add(presentId)
+
+    def remove(self, presentId, box):
+        for cell in self.cells_of(box):
+            self.cells[cell].discard(presentId)
+
+    def neighbours(self, box):
+        """ Ids of the presents registered in the cells covered by box. """
+        found = set()
+        for cell in self.cells_of(box):
+            found.update(self.cells.get(cell, ()))
+        return found
+
+
+class IncrementalMetric:
+    """ Metric of a submission under single present moves, with rollback. """
+
+    def __init__(self, presents, submission):
+        """ Arguments:
+            presents: array (N, 4) as returned by MetricCalculation.readPresentsArray
+            submission: array (N, 25) as returned by MetricCalculation.readSubmissionArray
+        The submission must be valid: it is checked like MetricCalculation does.
+        """
+        presentIds = submission[:, 0]
+        bounds, valid = MetricCalculation.getPackageBounds(submission[:, 1:])
+        MetricCalculation.validatePackages(presents, submission, bounds, valid)
+        order = MetricCalculation.getOrderFromTop(presentIds, bounds)
+        collision = MetricCalculation.findFirstCollision(presentIds, bounds, order)
+        if collision is not None:
+            raise ValueError('Collision detected between presents %d, %d' % collision)
+
+        self.expectedDimensions = dict(zip(presentIds.tolist(),
+            [set(d) for d in MetricCalculation.getExpectedDimensions(presents, presentIds).tolist()]))
+        self.boxes = dict(zip(presentIds.tolist(), [tuple(box) for box in bounds.tolist()]))
+        self.grid = PresentsGrid()
+        for presentId, box in self.boxes.iteritems():
+            self.grid.add(presentId, box)
+
+        # sweep order, as keys -MaxZ * keyScale + PresentId sorted increasingly
+        self.keyScale = int(presentIds.max()) + 1
+        self.orderIds = presentIds[order].copy()
+        self.keys = self.key(bounds[order, 5], self.orderIds)
+        self.orderTerm = MetricCalculation.getOrderTerm(presentIds, order)
+        self.undo = []
+
+    def key(self, maxz, presentId):
+        return -maxz * self.keyScale + presentId
+
+    @property
+    def heightTerm(self):
+        return int(-(self.keys[0] // self.keyScale))
+
+    @property
+    def metric(self):
+        return 2 * self.heightTerm + self.orderTerm
+
+    def check_box(self, presentId, box):
+        """ Same checks as MetricCalculation.validatePackages, for one box. """
+        minx, maxx, miny, maxy, minz, maxz = box
+        if not (minx < maxx and miny < maxy and minz < maxz):
+            raise ValueError('Error with package vertices of present %d' % presentId)
+        if set([maxx - minx + 1, maxy - miny + 1, maxz - minz + 1]) != self.expectedDimensions[presentId]:
+            raise ValueError('Package %d is not of the expected dimension' % presentId)
+        if not (minx > 0 and maxx <= 1000 and miny > 0 and maxy <= 1000 and minz > 0):
+            raise ValueError('Package %d is not in the sleigh' % presentId)
+
+    def collides(self, presentId, box):
+        """ True if box collides with another present, with the test of the
+        metric sweep: a present A before B in the sweep order collides with B if
+        they intersect in the xy-plane, A.MinZ <= B.MaxZ and A.MaxZ > B.MinZ.
+        """
+        key = self.key(box[5], presentId)
+        for otherId in self.grid.neighbours(box):
+            if otherId == presentId:
+                continue
+            other = self.boxes[otherId]
+            if other[1] < box[0] or other[0] > box[1] or other[3] < box[2] or other[2] > box[3]:
+                continue
+            if self.key(other[5], otherId) < key:
+                above, below = other, box
+            else:
+                above, below = box, other
+            if above[4] <= below[5] and above[5] > below[4]:
+                return True
+        return False
+
+    def reorder(self, presentId, oldMaxz, newMaxz):
+        """ Moves presentId in the sweep order and updates the order term:
+        the presents between its old and new rank shift by one position.
+        """
+        oldKey = self.key(oldMaxz, presentId)
+        newKey = self.key(newMaxz, presentId)
+        keys, ids = self.keys, self.orderIds
+        r0 = int(np.searchsorted(keys, oldKey))
+        if newKey > oldKey:
+            r1 = int(np.searchsorted(keys, newKey)) - 1
+            shifted = ids[r0 + 1:r1 + 1]
+            positions = np.arange(r0 + 2, r1 + 2)
+            # positions decrease by one
+            delta = int((positions <= shifted).sum()) - int((positions > shifted).sum())
+            keys[r0:r1] = keys[r0 + 1:r1 + 1]
+            ids[r0:r1] = shifted.copy()
+        else:
+            r1 = int(np.searchsorted(keys, newKey))
+            shifted = ids[r1:r0]
+            positions = np.arange(r1 + 1, r0 + 1)
+            # positions increase by one
+            delta = int((positions >= shifted).sum()) - int((positions < shifted).sum())
+            keys[r1 + 1:r0 + 1] = keys[r1:r0].copy()
+            ids[r1 + 1:r0 + 1] = shifted.copy()
+        keys[r1] = newKey
+        ids[r1] = presentId
+        self.orderTerm += delta + abs(r1 + 1 - presentId) - abs(r0 + 1 - presentId)
+
+    def place(self, presentId, box):
+        oldBox = self.boxes[presentId]
+        self.grid.remove(presentId, oldBox)
+        self.grid.add(presentId, box)
+        self.boxes[presentId] = box
+        self.reorder(presentId, oldBox[5], box[5])
+        return oldBox
+
+    def move(self, presentId, box):
+        """ Moves a present to box (MinX, MaxX, MinY, MaxY, MinZ, MaxZ).
+        Returns the new metric, or None (and nothing changes) if the present
+        would collide with another one.
+        """
+        box = tuple(int(v) for v in box)
+        self.check_box(presentId, box)
+        if self.collides(presentId, box):
+            return None
+        self.undo.append((presentId, self.place(presentId, box)))
+        return self.metric
+
+    def commit(self):
+        """ Keeps the moves done since the last commit or rollback. """
+        self.undo = []
+
+    def rollback(self):
+        """ Undoes the moves done since the last commit or rollback. """
+        while self.undo:
+            presentId, box = self.undo.pop()
+            self.place(presentId, box)
+        return self.metric
+
+
+def from_files(presentsFilename, submissionFilename):
+    """ IncrementalMetric of a submission csv. """
+    return IncrementalMetric(MetricCalculation.readPresentsArray(presentsFilename),
+                             MetricCalculation.readSubmissionArray(submissionFilename))
@@ -11,8 +11,20 @@ import os
 import csv
 import math
 import time
+import heapq
+import shutil
+import argparse
+import tempfile
+import itertools
+import multiprocessing
 from collections import namedtuple
 
+import numpy as np
+
+import BinaryFormat
+import PresentsLoader
+from Formats import read_int_csv, iter_int_csv_chunks, getPackageBounds
+
 
 def int_reader_wrapper(reader):
     """ Allows file contents to be read as ints not as strings. """
@@ -28,11 +40,8 @@ def readPresentsFile(presentsFilename):
         Dictionary of lists.
     """
     solution = {}    
-    with open(presentsFilename, 'rb') as f:
-        f.readline() # header
-        fcsv = int_reader_wrapper(csv.reader(f))
-        for row in fcsv:
-            solution[row[0]] = row[1:]
+    for row in PresentsLoader.read_presents_rows(presentsFilename):
+        solution[row[0]] = row[1:]
     return solution
         
 def readSubmissionFile(submissionFilename):
@@ -181,99 +190,467 @@ def GetOrderedPresentsStartingAtTop(solution, submission):
         update_ordered_presents(orderedPresents, presents[presentId].MaxZ, presentId)
     return presents, orderedPresents
 
-def remove_presents_above_zheight(currentPresentsSet, zheight, presents):
-    """ If zheight is lower than minimum z values of presents in currentPresentsSet,
-    the remove from currentPresentsSet.
+class ActivePresentsGrid:
+    """ Presents of the current z cross section, indexed by a uniform grid over
+    the sleigh footprint, so that a new present is only compared against the
+    presents registered in the cells it covers.
+    Presents are given by their id and their box (MinX, MaxX, MinY, MaxY, MinZ, MaxZ).
+    The ids are also kept in a set updated by the same add and difference_update
+    calls as currentPresentsSet in the brute-force sweep, so that a collision
+    reports the same present as the brute-force sweep (see first_colliding).
+    """
+    CELL_SIZE = 20
+
+    def __init__(self, SleightWidth=1000):
+        ncells = (SleightWidth + self.CELL_SIZE - 1) // self.CELL_SIZE
+        self.cells = [[set() for j in xrange(ncells)] for i in xrange(ncells)]
+        self.boxes = {}
+        self.heap = [] # (-MinZ, present id) of the presents in the grid
+        self.ids = set() # ids of the presents in the grid, in the order of currentPresentsSet
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def cells_of(self, box):
+        """ Returns the grid cells covered by the footprint of box. """
+        size = self.CELL_SIZE
+        rows = self.cells[(box[0] - 1) // size:(box[1] - 1) // size + 1]
+        ylo = (box[2] - 1) // size
+        yhi = (box[3] - 1) // size + 1
+        return [cell for row in rows for cell in row[ylo:yhi]]
+
+    def remove_above_zheight(self, zheight):
+        """ Removes the presents whose MinZ is above zheight. """
+        removed = set()
+        while self.heap and -self.heap[0][0] > zheight:
+            presentId = heapq.heappop(self.heap)[1]
+            for cell in self.cells_of(self.boxes.pop(presentId)):
+                cell.discard(presentId)
+            removed.add(presentId)
+        self.ids.difference_update(removed)
+
+    def colliding(self, box):
+        """ Returns the ids of the presents in the grid colliding with box,
+        with the same test as Present.intersects_with_another_present.
+        """
+        minx, maxx, miny, maxy, minz, maxz = box
+        boxes = self.boxes
+        seen = set()
+        found = []
+        for cell in self.cells_of(box):
+            for j in cell:
+                if j in seen:
+                    continue
+                seen.add(j)
+                other = boxes[j]
+                if other[1] < minx or other[0] > maxx or \
+                   other[3] < miny or other[2] > maxy:
+                    continue
+                if other[4] <= maxz and other[5] > minz:
+                    found.append(j)
+        return found
+
+    def first_colliding(self, box):
+        """ Returns the id of the first present colliding with box in the iteration
+        order of currentPresentsSet, the one reported by the brute-force sweep, or None.
+        """
+        colliding = self.colliding(box)
+        if colliding:
+            return first_in_set_order(self.ids, colliding)
+        return None
+
+    def add(self, presentId, box):
+        for cell in self.cells_of(box):
+            cell.add(presentId)
+        self.boxes[presentId] = box
+        heapq.heappush(self.heap, (-box[4], presentId))
+        self.ids.add(presentId)
+
+def first_in_set_order(presentsSet, presentIds):
+    """ Returns the first element of presentsSet, in its iteration order, that is in presentIds. """
+    presentIds = set(presentIds)
+    for presentId in presentsSet:
+        if presentId in presentIds:
+            return presentId
+
+def getTotalVolume(solution):
+    """ Returns the total occupied volume of all the presents. """
+    volume = 0
+    for id in solution:
+        volume += solution[id][0] * solution[id][1] * solution[id][2]
+    return volume
+    
+def readPresentsArray(presentsFilename):
+    """ Read file contents into memory as an integer array, through the cache of
+    PresentsLoader.
     Arguments:
-        currentPresentsSet: list of present ids of presents currently in zheight cross section
-        zheight: current position in z
-        presents: dictionary of Present objects, key is present id
+        presentsFilename: name of file containing present Ids and Dimensions
+            (presents.csv, or its binary version presents.npy)
     Returns:
-        void (updated currentPresents)
+        Array of shape (N, 4): PresentId, Dimension1, Dimension2, Dimension3
     """
-    presentsToDiscard = set([i for i in currentPresentsSet if presents[i].MinZ > zheight])
-    currentPresentsSet.difference_update(presentsToDiscard)
-    
-def add_to_current_presents(currentPresentsSet, presents, presentToAdd):
-    """ Given set of current presents, check for collisions with presentToAdd.
-    If no intersection, then adds presentToAdd to currentPresentsSet
+    return PresentsLoader.load_presents(presentsFilename)
+
+def readSubmissionArray(submissionFilename):
+    """ Read file contents into memory as an integer array, sorted by PresentId.
     Arguments:
-        currentPresentsSet: set of current present ids at current z-height of sleigh
-        presents: dictionary of Present objects, key is present id
-        presentToAdd: present id to be added to currentPresentsSet
+        submissionFilename: name of file containing present Ids and packing locations
     Returns:
-        void (updated currentPresentsSet)
+        Array of shape (N, 25): PresentId followed by the 8 vertices x, y, z
     """
-    for pid in currentPresentsSet:
-        if presents[pid].intersects_with_another_present(presents[presentToAdd]):
-            print 'Collision found between presents ' + str(pid) + ', ' + str(presentToAdd)
+    submission = read_int_csv(submissionFilename, 25)
+    return submission[np.argsort(submission[:, 0], kind='mergesort')]
+
+def getExpectedDimensions(presents, presentIds):
+    """ Returns the dimensions of presents.csv for the given present ids. """
+    index = np.searchsorted(presents[:, 0], presentIds)
+    index = np.minimum(index, max(len(presents) - 1, 0))
+    if len(presents) == 0 or not (presents[index, 0] == presentIds).all():
+        missing = presentIds[0] if len(presents) == 0 else presentIds[presents[index, 0] != presentIds][0]
+        print 'Submitted package ' + str(missing) + ' is not in the presents file'
+        exit()
+    return presents[index, 1:]
+
+def validatePackages(presents, submission, bounds, valid):
+    """ Columnar version of the checks done in Present.__init__: vertices,
+    dimensions (as sets, so packages may be rotated) and sleigh bounds.
+    Reports the first faulty package by PresentId and exits.
+    """
+    presentIds = submission[:, 0]
+    expected = getExpectedDimensions(presents, presentIds)
+    submitted = bounds[:, 1::2] - bounds[:, 0::2] + 1
+    sameDimensions = (expected[:, :, None] == submitted[:, None, :]).any(axis=2).all(axis=1) \
+        & (submitted[:, :, None] == expected[:, None, :]).any(axis=2).all(axis=1)
+    SleightWidth = 1000
+    inSleigh = (bounds[:, 0] > 0) & (bounds[:, 1] <= SleightWidth) \
+        & (bounds[:, 2] > 0) & (bounds[:, 3] <= SleightWidth) & (bounds[:, 4] > 0)
+
+    faulty = np.flatnonzero(~(valid & sameDimensions & inSleigh))
+    if len(faulty) == 0:
+        return
+    i = faulty[0]
+    presentId = int(presentIds[i])
+    if not valid[i]:
+        print 'Error with submitted package vertices'
+    elif not sameDimensions[i]:
+        print 'Submitted package ' + str(presentId) + ' is not of the expected dimension'
+        print 'Expected Dimensions = ' + str(expected[i].tolist())
+        print 'Submitted Dimensions = ' + str(submitted[i].tolist())
+    else:
+        row = submission[i, 1:].tolist()
+        packageVertices = [Vertex(*row[j*3:j*3 + 3]) for j in xrange(8)]
+        print 'Submitted package ' + str(presentId) + ' is not in the sleigh'
+        print 'Package Vertices = ' + str(packageVertices)
+    exit()
+
+def getOrderFromTop(presentIds, bounds):
+    """ Indices of the presents as they appear in the sleigh from top to bottom,
+    smallest present id first within the same horizontal cross section.
+    """
+    return np.lexsort((presentIds, -bounds[:, 5]))
+
+def getOrderTerm(presentIds, order):
+    """ Sum of |position from the top - present id| over all presents. """
+    positions = np.arange(1, len(order) + 1)
+    return int(np.abs(positions - presentIds[order]).sum())
+
+def findFirstCollision(presentIds, bounds, order):
+    """ Sweeps the sleigh from top to bottom, keeping the presents of the current
+    cross section in an ActivePresentsGrid, and returns the first pair of colliding
+    present ids or None, the same pair as the brute-force sweep.
+    """
+    ids = presentIds[order].tolist()
+    boxes = [tuple(box) for box in bounds[order].tolist()]
+    current = ActivePresentsGrid()
+    zheight = None
+    for presentId, box in zip(ids, boxes):
+        if box[5] != zheight:
+            zheight = box[5]
+            current.remove_above_zheight(zheight)
+        colliding = current.first_colliding(box)
+        if colliding is not None:
+            return colliding, presentId
+        current.add(presentId, box)
+    return None
+
+def sweepSetBefore(presentIds, bounds, end):
+    """ Returns currentPresentsSet of the brute-force sweep over presents in sweep
+    order when the present at position end is checked, built by the same add and
+    difference_update calls so that it iterates in the same order.
+    """
+    ids = presentIds[:end + 1].tolist()
+    minz = bounds[:end + 1, 4].tolist()
+    maxz = bounds[:end + 1, 5].tolist()
+    currentPresentsSet = set()
+    heap = [] # (-MinZ, present id) of the presents in currentPresentsSet
+    zheight = None
+    for k in xrange(end + 1):
+        if maxz[k] != zheight:
+            zheight = maxz[k]
+            removed = set()
+            while heap and -heap[0][0] > zheight:
+                removed.add(heapq.heappop(heap)[1])
+            currentPresentsSet.difference_update(removed)
+        if k < end:
+            currentPresentsSet.add(ids[k])
+            heapq.heappush(heap, (-minz[k], ids[k]))
+    return currentPresentsSet
+
+SLABS_PER_JOB = 4
+slabPresents = None # (present ids, bounds) in sweep order, shared with the slab workers
+
+def init_slab_worker(presentIds, bounds):
+    global slabPresents
+    slabPresents = (presentIds, bounds)
+
+def check_slab(slab):
+    """ Collision sweep of one z-slab: the presents at positions [start, end) of the
+    sweep order are checked, against each other and against the presents above the
+    slab that reach into it, which are added to the grid first without being checked.
+    Returns the position in the sweep order of the first present of the slab that
+    collides and the ids of the presents it collides with, or None.
+    """
+    start, end = slab
+    presentIds, bounds = slabPresents
+    top = bounds[start, 5]
+    above = np.flatnonzero(bounds[:start, 4] <= top)
+    current = ActivePresentsGrid()
+    for presentId, box in zip(presentIds[above].tolist(), bounds[above].tolist()):
+        current.add(presentId, tuple(box))
+    zheight = None
+    for k, presentId, box in zip(xrange(start, end), presentIds[start:end].tolist(), bounds[start:end].tolist()):
+        box = tuple(box)
+        if box[5] != zheight:
+            zheight = box[5]
+            current.remove_above_zheight(zheight)
+        colliding = current.colliding(box)
+        if colliding:
+            return k, colliding
+        current.add(presentId, box)
+    return None
+
+def findFirstCollisionParallel(presentIds, bounds, order, jobs):
+    """ Same result as findFirstCollision, with the sleigh split into z-slabs
+    (ranges of the sweep order) checked by a pool of jobs processes.
+    A present only collides with presents before it in the sweep order whose MinZ
+    is not above its MaxZ, so each slab gets the presents above it that reach into
+    it: the first collision of the first slab that has one is the serial answer.
+    The present reported with it is found by replaying the brute-force set up to
+    there (see sweepSetBefore), since the grid of a slab does not have its history.
+    """
+    nslabs = min(jobs * SLABS_PER_JOB, len(order))
+    cuts = np.linspace(0, len(order), nslabs + 1).astype(int).tolist()
+    slabs = [(cuts[k], cuts[k + 1]) for k in xrange(nslabs) if cuts[k] < cuts[k + 1]]
+    presentIds = presentIds[order]
+    bounds = bounds[order]
+    pool = multiprocessing.Pool(jobs, init_slab_worker, (presentIds, bounds))
+    collision = None
+    try:
+        for collision in pool.imap(check_slab, slabs):
+            if collision is not None:
+                break
+    finally:
+        pool.terminate()
+        pool.join()
+    if collision is None:
+        return None
+    k, colliding = collision
+    return first_in_set_order(sweepSetBefore(presentIds, bounds, k), colliding), int(presentIds[k])
+
+STREAM_CHUNK_ROWS = 200000
+STREAM_BLOCK_ROWS = 4096
+
+def save_run(records, tmpdir, runs, prefix):
+    """ Spill an array of sorted records to a new run file in tmpdir. """
+    filename = os.path.join(tmpdir, '%s%d.npy' % (prefix, len(runs)))
+    np.save(filename, records)
+    runs.append(filename)
+
+def iter_run_rows(filename):
+    """ Yields the records of a run file as lists, reading one block at a time. """
+    records = np.load(filename, mmap_mode='r')
+    for start in xrange(0, len(records), STREAM_BLOCK_ROWS):
+        for row in np.array(records[start:start + STREAM_BLOCK_ROWS]).tolist():
+            yield row
+    del records
+
+def iter_presents_upto(presentsChunks):
+    """ Coroutine over the chunks of presents.csv (sorted by PresentId): send it
+    the largest id needed, it returns the presents read so far that are not
+    needed anymore, up to that id.
+    """
+    buffered = np.empty((0, 4), dtype=np.int64)
+    lastId = 0
+    upto = yield
+    for chunk in presentsChunks:
+        if (np.diff(chunk[:, 0]) <= 0).any() or chunk[0, 0] <= lastId:
+            print 'Presents file must be sorted by PresentId for the streaming mode'
             exit()
-    currentPresentsSet.add(presentToAdd)
-                
+        lastId = chunk[-1, 0]
+        buffered = np.concatenate((buffered, chunk))
+        while len(buffered) > 0 and buffered[-1, 0] >= upto:
+            cut = np.searchsorted(buffered[:, 0], upto, side='right')
+            upto = yield buffered[:cut]
+            buffered = buffered[cut:]
+    while True:
+        upto = yield buffered
+        buffered = buffered[:0]
 
-def update_current_presents(currentPresentsSet, zheight, presents, presentsInCrossSection):    
-    """ Given the presents in the current horizontal cross section,
-    checks for present intersections and updates list currentPresents 
-    based on min/max z-values.
+def spill_submission_by_id(submissionChunks, tmpdir):
+    """ First pass of the streaming mode: sorts each chunk of the submission by
+    PresentId, with a validity flag for the vertices, and spills it to a run file.
+    """
+    runs = []
+    for chunk in submissionChunks:
+        bounds, valid = getPackageBounds(chunk[:, 1:])
+        records = np.column_stack((chunk, valid))
+        save_run(records[np.argsort(chunk[:, 0], kind='mergesort')], tmpdir, runs, 'id')
+    return runs
+
+def spill_submission_by_height(presentsChunks, idRuns, chunkRows, tmpdir):
+    """ Second pass of the streaming mode: merges the runs sorted by id with
+    presents.csv to check the packages, and spills the package boxes sorted by
+    (-MaxZ, PresentId) to new run files.
+    Records: -MaxZ, PresentId, MinX, MaxX, MinY, MaxY, MinZ
+    """
+    presentsUpto = iter_presents_upto(presentsChunks)
+    presentsUpto.next()
+    runs = []
+    pending = []
+    pendingRows = 0
+    merged = heapq.merge(*[iter_run_rows(run) for run in idRuns])
+    while True:
+        block = list(itertools.islice(merged, STREAM_BLOCK_ROWS))
+        if not block:
+            break
+        block = np.array(block, dtype=np.int64)
+        submission, valid = block[:, :25], block[:, 25].astype(bool)
+        bounds = getPackageBounds(submission[:, 1:])[0]
+        presents = presentsUpto.send(submission[-1, 0])
+        validatePackages(presents, submission, bounds, valid)
+
+        records = np.column_stack((-bounds[:, 5], submission[:, 0], bounds[:, :5]))
+        pending.append(records)
+        pendingRows += len(records)
+        if pendingRows >= chunkRows:
+            records = np.concatenate(pending)
+            save_run(records[np.lexsort((records[:, 1], records[:, 0]))], tmpdir, runs, 'height')
+            pending = []
+            pendingRows = 0
+    if pending:
+        records = np.concatenate(pending)
+        save_run(records[np.lexsort((records[:, 1], records[:, 0]))], tmpdir, runs, 'height')
+    return runs
+
+def streamSubmissionFile(presentsFilename, submissionFilename, chunkRows=STREAM_CHUNK_ROWS, binary=False):
+    """ Bounded-memory version of the metric: the submission goes through an
+    external sort spilled to temporary files, first by PresentId (to be checked
+    against presents.csv) then from the top of the sleigh down, and only the
+    presents of the current z cross section are kept in memory by the sweep.
+    Reports faulty packages and collisions like the in-memory version.
     Arguments:
-        currentPresentsSet: set of present ids for presents intersecting
-            current z-height
-        presents: dictionary of Present objects
-        presentsInCrossSection: list of present ids in current cross section
+        presentsFilename: name of file containing present Ids and Dimensions,
+            sorted by PresentId
+        submissionFilename: name of file containing present Ids and packing locations
+        chunkRows: number of rows sorted in memory at a time
+        binary: if True, both files are in the format of BinaryFormat
     Returns:
-        void (updates currentPresentsSet)
+        orderTerm, heightTerm
     """
-    remove_presents_above_zheight(currentPresentsSet, zheight, presents)
-    for i in xrange(len(presentsInCrossSection)):
-        if len(currentPresentsSet) == 0:    
-            currentPresentsSet.add(presentsInCrossSection[i])
+    tmpdir = tempfile.mkdtemp(prefix='sleigh_metric_')
+    try:
+        if binary:
+            presentsChunks = BinaryFormat.iter_presents_chunks(BinaryFormat.load_presents(presentsFilename), chunkRows)
+            submissionChunks = BinaryFormat.iter_submission_chunks(BinaryFormat.load_placements(submissionFilename), chunkRows)
         else:
-            add_to_current_presents(currentPresentsSet, presents, presentsInCrossSection[i])
+            presentsChunks = iter_int_csv_chunks(presentsFilename, 4, chunkRows)
+            submissionChunks = iter_int_csv_chunks(submissionFilename, 25, chunkRows)
+        idRuns = spill_submission_by_id(submissionChunks, tmpdir)
+        heightRuns = spill_submission_by_height(presentsChunks, idRuns, chunkRows, tmpdir)
+        for run in idRuns:
+            os.remove(run)
+
+        orderTerm = 0
+        heightTerm = None
+        presentsSeenSoFar = 0
+        current = ActivePresentsGrid()
+        zheight = None
+        for record in heapq.merge(*[iter_run_rows(run) for run in heightRuns]):
+            presentId = record[1]
+            box = (record[2], record[3], record[4], record[5], record[6], -record[0])
+            if box[5] != zheight:
+                zheight = box[5]
+                current.remove_above_zheight(zheight)
+                if heightTerm is None:
+                    heightTerm = zheight
+            colliding = current.first_colliding(box)
+            if colliding is not None:
+                print 'Collision detected between presents ' + str(colliding) + ', ' + str(presentId)
+                exit()
+            current.add(presentId, box)
+
+            presentsSeenSoFar += 1
+            orderTerm += abs(presentsSeenSoFar - presentId)
+    finally:
+        shutil.rmtree(tmpdir)
+    return orderTerm, heightTerm
 
-def getTotalVolume(solution):
-    """ Returns the total occupied volume of all the presents. """
-    volume = 0
-    for id in solution:
-        volume += solution[id][0] * solution[id][1] * solution[id][2]
-    return volume
-    
 import sys    
 if __name__ == "__main__":
     
     start = time.clock()
     
+    parser = argparse.ArgumentParser(description="Packing Santa's Sleigh -- Metric Calculation")
+    parser.add_argument('submission', help='name of submission csv')
+    parser.add_argument('--stream', action='store_true',
+                        help='bounded memory: external sort of the submission through temporary files')
+    parser.add_argument('--chunk-rows', type=int, default=STREAM_CHUNK_ROWS,
+                        help='rows sorted in memory at a time in streaming mode')
+    parser.add_argument('--jobs', type=int, default=1,
+                        help='number of processes for the collision check (in-memory mode)')
+    parser.add_argument('--binary', action='store_true',
+                        help='read presents.npy and a binary submission (see BinaryFormat.py)')
+    args = parser.parse_args()
+
     path = '.'
-    presentsFilename = os.path.join(path, 'presents.csv')
-    if len(sys.argv) <= 1:
-       print "One argument is required (name of submission csv)"
-       exit()
-       
-    submissionFilename = os.path.join(path, sys.argv[1])
-
-    # read file contents into solution dictionary and submission dictionary
-    solution = readPresentsFile(presentsFilename)
-    submission = readSubmissionFile(submissionFilename)
-    print 'contents in memory'
-    
-    # create presents objects, and their order going down sleigh 
-    presents, orderedPresents = GetOrderedPresentsStartingAtTop(solution, submission)
+    presentsFilename = os.path.join(path, 'presents.npy' if args.binary else 'presents.csv')
+    submissionFilename = os.path.join(path, args.submission)
 
-    orderTerm = 0
-    presentsSeenSoFar = 0
-    currentPresentsSet = set()
-    for zheight in sorted(orderedPresents.iterkeys(), reverse=True):
-        presentsInCrossSection = list(orderedPresents[zheight])
-        presentsInCrossSection.sort()
-        update_current_presents(currentPresentsSet, zheight, presents, presentsInCrossSection)
+    if args.stream:
+        orderTerm, heightTerm = streamSubmissionFile(presentsFilename, submissionFilename,
+                                                     args.chunk_rows, args.binary)
+    else:
+        # read file contents into integer arrays
+        presents = readPresentsArray(presentsFilename)
+        if args.binary:
+            submission = BinaryFormat.placements_submission(BinaryFormat.load_placements(submissionFilename))
+            submission = submission[np.argsort(submission[:, 0], kind='mergesort')]
+        else:
+            submission = readSubmissionArray(submissionFilename)
+        print 'contents in memory'
 
-        # calculate order term on the fly
-        for i in xrange(len(presentsInCrossSection)):
-            presentsSeenSoFar += 1
-            orderTerm += math.fabs(presentsSeenSoFar - presentsInCrossSection[i])
-    
-    metric = 2 * max(orderedPresents.keys()) + orderTerm
+        # package bounds and validity checks, on whole columns
+        presentIds = submission[:, 0]
+        bounds, valid = getPackageBounds(submission[:, 1:])
+        validatePackages(presents, submission, bounds, valid)
+
+        # order going down the sleigh
+        order = getOrderFromTop(presentIds, bounds)
+        if args.jobs > 1:
+            collision = findFirstCollisionParallel(presentIds, bounds, order, args.jobs)
+        else:
+            collision = findFirstCollision(presentIds, bounds, order)
+        if collision is not None:
+            print 'Collision detected between presents ' + str(collision[0]) + ', ' + str(collision[1])
+            exit()
+
+        orderTerm = getOrderTerm(presentIds, order)
+        heightTerm = int(bounds[:, 5].max())
+
+    orderTerm = float(orderTerm)
+    metric = 2 * heightTerm + orderTerm
     print 'Metric = ' + str(metric)
     print 'Order term = ' + str(orderTerm)
-    print 'Height term = ' + str(max(orderedPresents.keys()))
+    print 'Height term = ' + str(heightTerm)
 
     print '\nTotal clock time = ' + str(time.clock() - start)
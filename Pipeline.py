@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Packing Santa's Sleigh -- Pipeline stages
+BackgroundWriter: a writer thread does the writes (and gzip compression) of a
+file while the caller formats the next block. Its queue holds at most
+QUEUE_SIZE blocks, so that the caller never runs more than that far ahead. An
+exception in the thread is raised again in the caller.
+
+    f = Pipeline.BackgroundWriter(open('submission.csv', 'wb'))
+"""
+
+import sys
+import Queue
+import threading
+
+QUEUE_SIZE = 4
+
+
+class Done:
+    """ End of a queue, with the exception info of the thread if it failed """
+    def __init__(self, error=None):
+        self.error = error
+
+
+def raise_error(error):
+    raise error[0], error[1], error[2]
+
+
+class BackgroundWriter:
+    """ File object whose writes are done by a writer thread, at most size writes behind. """
+
+    def __init__(self, f, size=QUEUE_SIZE):
+        self.f = f
+        self.queue = Queue.Queue(size)
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name='writer')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def run(self):
+        while True:
+            data = self.queue.get()
+            if isinstance(data, Done):
+                return
+            if self.error is None:
+                try:
+                    self.f.write(data)
+                except BaseException:
+                    self.error = sys.exc_info()
+
+    def write(self, data):
+        if self.error is not None:
+            raise_error(self.error)
+        self.queue.put(data)
+
+    def close(self):
+        """ Waits for the pending writes and closes the file """
+        self.queue.put(Done())
+        self.thread.join()
+        self.f.close()
+        if self.error is not None:
+            raise_error(self.error)
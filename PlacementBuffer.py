@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""
+Packing Santa's Sleigh -- Placement buffer
+The top-down solvers pack from z = 1 upwards and flip z when writing, so that
+the first presents end up at the top of the sleigh. The flip needs the final
+height (maxz), so the placements are recorded in compact arrays while packing
+and the submission is written from them at the end, instead of packing twice.
+"""
+
+from array import array
+
+import numpy as np
+
+
+class PlacementBuffer:
+    """ Placements in packing coordinates: PresentId, x1, x2, y1, y2, z1, z2,
+    where z1 is used for the first 4 vertices and z2 for the last 4 ones.
+    """
+    def __init__(self):
+        self.ids = array('i')
+        self.coordinates = array('i')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def append(self, presentId, x1, x2, y1, y2, z1, z2):
+        self.ids.append(presentId)
+        self.coordinates.extend((x1, x2, y1, y2, z1, z2))
+
+    def write(self, writer, maxz):
+        """ Writes one submission row per placement with a SubmissionWriter,
+        flipping z: z becomes maxz - z + 1.
+        """
+        ids = np.frombuffer(self.ids, dtype=np.int32)
+        coordinates = np.frombuffer(self.coordinates, dtype=np.int32).reshape(-1, 6).astype(np.int64)
+        x1, x2, y1, y2, z1, z2 = coordinates.T
+        writer.write_bounds(ids, x1, x2, y1, y2, maxz - z1 + 1, maxz - z2 + 1)
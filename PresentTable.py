@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Packing Santa's Sleigh -- Present table
+The presents of a layer solver as columns instead of one object per present:
+row i of every column is present i of the presents file. A layer is an array of
+row indices into the table, and its rotation, reflection and compaction are
+operations on whole columns.
+
+    table = PresentTable.from_file('presents.csv')
+    table.reflect(rows, SLEIGH_LENGTH)
+    table.record(rows)              # rows written next, in that order
+    table.write(writer, maxz)       # with a SubmissionWriter, z flipped
+"""
+
+from array import array
+
+import numpy as np
+
+import PresentsLoader
+import SubmissionWriter
+
+
+class PresentTable:
+    """ Columns of the presents: id, dimensions (width along x, height along y and
+    z_depth, in increasing order until rotated), area of the footprint, and min
+    corner of the present once packed (0 before). The dimensions and the x-y
+    positions, within the 1000 x 1000 sleigh, are int16, the others int32.
+    """
+    FIELDS = ['id', 'width', 'height', 'z_depth', 'area', 'xpos', 'ypos', 'zpos']
+    DTYPES = {'id': np.int32, 'width': np.int16, 'height': np.int16, 'z_depth': np.int16,
+              'area': np.int32, 'xpos': np.int16, 'ypos': np.int16, 'zpos': np.int32}
+    # columns that change while packing, saved by state()
+    STATE_FIELDS = ['width', 'height', 'xpos', 'ypos', 'zpos']
+
+    def __init__(self, n):
+        for name in self.FIELDS:
+            setattr(self, name, np.zeros(n, dtype=self.DTYPES[name]))
+        self.recorded = array('i') # rows in submission order
+
+    @classmethod
+    def from_presents(cls, presents, areas):
+        """ Table of the arrays of PresentsLoader.load_sorted_presents """
+        table = cls(len(presents))
+        table.id[:] = presents[:, 0]
+        table.width[:] = presents[:, 1]
+        table.height[:] = presents[:, 2]
+        table.z_depth[:] = presents[:, 3]
+        table.area[:] = areas
+        return table
+
+    @classmethod
+    def from_file(cls, presentsFilename):
+        return cls.from_presents(*PresentsLoader.load_sorted_presents(presentsFilename, np.int32))
+
+    def __len__(self):
+        return len(self.id)
+
+    def take(self, rows):
+        """ New table of the given rows, in that order """
+        table = PresentTable(len(rows))
+        for name in self.FIELDS:
+            getattr(table, name)[:] = getattr(self, name)[rows]
+        return table
+
+    def copy(self):
+        return self.take(np.arange(len(self)))
+
+    def presents_array(self, start, end):
+        """ Array (end - start, 6) of row, PresentId, width, height, z_depth and area
+        of the rows from start to end (excluded)
+        """
+        columns = [np.arange(start, end, dtype=np.int32)] + \
+            [getattr(self, name)[start:end] for name in ['id', 'width', 'height', 'z_depth', 'area']]
+        return np.column_stack(columns)
+
+    def iter_presents(self, first=0):
+        """ Yields [row, PresentId, width, height, z_depth, area] lists of ints,
+        from row first on, converting PresentsLoader.BLOCK_ROWS rows at a time.
+        """
+        for start in xrange(first, len(self), PresentsLoader.BLOCK_ROWS):
+            for present in self.presents_array(start, min(start + PresentsLoader.BLOCK_ROWS, len(self))).tolist():
+                yield present
+
+    def sort_by_id(self, rows):
+        rows = np.asarray(rows, dtype=np.intp)
+        return rows[np.argsort(self.id[rows], kind='mergesort')]
+
+    def rotate(self, rows):
+        """ Turns the presents of rows by 90 degrees on the x-y plane """
+        width = self.width[rows]
+        self.width[rows] = self.height[rows]
+        self.height[rows] = width
+
+    def reflect(self, rows, length):
+        """ Reflects the presents of rows along x and y in a length x length sleigh """
+        self.xpos[rows] = 1 + length - (self.xpos[rows] + self.width[rows] - 1)
+        self.ypos[rows] = 1 + length - (self.ypos[rows] + self.height[rows] - 1)
+
+    def tops(self, rows):
+        """ Top z of the presents of rows """
+        return self.zpos[rows] + self.z_depth[rows] - 1
+
+    def top_map(self, rows, length):
+        """ Height map of the presents of rows, which must not overlap in the x-y
+        plane: for each (x, y) of the floor, the top z of the present above it (0 if none).
+        """
+        tops = np.zeros((length, length), dtype=np.int32)
+        for x, y, width, height, top in zip(self.xpos[rows].tolist(), self.ypos[rows].tolist(),
+                                            self.width[rows].tolist(), self.height[rows].tolist(),
+                                            self.tops(rows).tolist()):
+            tops[x-1:x+width-1, y-1:y+height-1] = top
+        return tops
+
+    def compact(self, rows, tops, z_min):
+        """ Moves the presents of rows, taken in that order, down onto the height map
+        tops of the layer below, as long as they do not go below z_min nor below a
+        present before them. All the presents of rows must be at the same zpos.
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        if len(rows) == 0:
+            return
+        zpos = self.zpos[rows]
+        # top of the tallest overlapping present of the layer below
+        below = np.array([tops[x-1:x+width-1, y-1:y+height-1].max()
+                          for x, y, width, height in zip(self.xpos[rows].tolist(), self.ypos[rows].tolist(),
+                                                         self.width[rows].tolist(), self.height[rows].tolist())],
+                         dtype=np.int32)
+        lowered = np.where((below > 0) & (below + 1 < zpos), below + 1, zpos)
+        # a present stays if it would go below a present before it; then the ones
+        # after it cannot go below it either, and they all stay
+        floors = np.maximum.accumulate(np.concatenate(([z_min], lowered[:-1])))
+        stays = np.flatnonzero(lowered < floors)
+        if len(stays):
+            lowered[stays[0]:] = zpos[stays[0]:]
+        self.zpos[rows] = lowered
+
+    def bounds(self, rows):
+        """ x1, x2, y1, y2, z1, z2 of the presents of rows, min and max corners """
+        return (self.xpos[rows], self.xpos[rows] + self.width[rows] - 1,
+                self.ypos[rows], self.ypos[rows] + self.height[rows] - 1,
+                self.zpos[rows], self.tops(rows))
+
+    def record(self, rows):
+        """ Appends rows to the presents to write, in that order """
+        self.recorded.extend(np.asarray(rows, dtype=np.int32).tolist())
+
+    def write(self, writer, maxz, rows=None):
+        """ Writes the recorded presents (or rows) with a SubmissionWriter, a block
+        of rows at a time, flipping z: z becomes maxz - z + 1.
+        """
+        if rows is None:
+            rows = np.frombuffer(self.recorded, dtype=np.int32)
+        for start in xrange(0, len(rows), SubmissionWriter.BLOCK_ROWS):
+            block = rows[start:start + SubmissionWriter.BLOCK_ROWS]
+            x1, x2, y1, y2, z1, z2 = [a.astype(np.int64) for a in self.bounds(block)]
+            writer.write_bounds(self.id[block], x1, x2, y1, y2, maxz - z1 + 1, maxz - z2 + 1)
+
+    def save(self, f, **arrays):
+        """ Writes all the columns and the recorded rows, with the given extra arrays,
+        to a .npz file (name or file object).
+        """
+        columns = dict((name, getattr(self, name)) for name in self.FIELDS)
+        columns.update(arrays)
+        np.savez(f, recorded=np.frombuffer(self.recorded, dtype=np.int32), **columns)
+
+    @classmethod
+    def load(cls, filename):
+        """ Table of a file written by save(), and the arrays of the file """
+        data = np.load(filename)
+        table = cls(len(data['id']))
+        for name in cls.FIELDS:
+            getattr(table, name)[:] = data[name]
+        table.recorded = array('i', np.asarray(data['recorded'], dtype=np.int32).tostring())
+        return table, data
+
+    def state(self):
+        """ Dictionary of the columns changed by packing and of the recorded rows """
+        state = dict((name, getattr(self, name)) for name in self.STATE_FIELDS)
+        state['recorded'] = np.frombuffer(self.recorded, dtype=np.int32)
+        return state
+
+    def set_state(self, state):
+        """ Restores a state() of the same presents """
+        for name in self.STATE_FIELDS:
+            getattr(self, name)[:] = state[name]
+        self.recorded = array('i', np.asarray(state['recorded'], dtype=np.int32).tostring())
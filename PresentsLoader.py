@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+"""
+Packing Santa's Sleigh -- Presents loader
+Reads presents.csv into an integer array in one call, with the dimensions of
+each present also sorted in increasing order and the area of its two smallest
+dimensions (its footprint in the top-down solvers).
+
+The parsed array is cached next to the csv (presents.csv -> presents.cache.npz)
+with the modification time and size of the csv, so that later runs load the
+cache instead of parsing the csv again; a cache that does not match the csv is
+rebuilt. The binary presents.npy (see BinaryFormat.py) is read directly.
+
+    presents = PresentsLoader.load_presents('presents.csv')  # (N, 4): PresentId, Dimension1..3
+    for row in PresentsLoader.read_sorted_rows('presents.csv'):
+        [presentId, width, height, z_depth, area] = row
+"""
+
+import os
+import zipfile
+
+import numpy as np
+
+import BinaryFormat
+import Formats
+
+CACHE_SUFFIX = '.cache.npz'
+BLOCK_ROWS = 4096 # rows converted to lists of ints at a time
+
+
+def cache_filename(presentsFilename):
+    return os.path.splitext(presentsFilename)[0] + CACHE_SUFFIX
+
+def file_key(filename):
+    """ Modification time and size of the file, identifying its contents """
+    info = os.stat(filename)
+    return np.array([info.st_mtime, info.st_size], dtype=np.float64)
+
+def sort_presents(presents):
+    """ Sorts the dimensions of the presents array (N, 4) in increasing order, in
+    place, and returns it with the array (N,) of the areas of the two smallest dimensions.
+    """
+    presents[:, 1:].sort(axis=1)
+    return presents, presents[:, 1] * presents[:, 2]
+
+def read_cache(filename, key, dtype=np.int64):
+    """ Presents array of the cache file, or None if it is missing, unreadable or stale. """
+    try:
+        cache = np.load(filename)
+        if not np.array_equal(cache['key'], key):
+            return None
+        return cache['presents'].astype(dtype, copy=False)
+    except (IOError, OSError, KeyError, ValueError, zipfile.BadZipfile):
+        return None
+
+def write_cache(filename, key, presents):
+    """ Replaces the cache file atomically, with the presents as int32 if they fit;
+    a directory that is not writable just leaves the presents uncached.
+    """
+    if len(presents) and presents.max() <= np.iinfo(np.int32).max and presents.min() >= 0:
+        presents = presents.astype(np.int32, copy=False)
+    tmpFilename = filename + '.tmp'
+    try:
+        with open(tmpFilename, 'wb') as f:
+            np.savez(f, key=key, presents=presents)
+        os.rename(tmpFilename, filename)
+    except (IOError, OSError):
+        pass
+
+def load_presents(presentsFilename, dtype=np.int64):
+    """ Array (N, 4) of dtype: PresentId, Dimension1, Dimension2, Dimension3, read
+    from the cache if it is up to date, or from the binary presents file if the file
+    name ends with .npy.
+    """
+    if presentsFilename.endswith('.npy'):
+        return BinaryFormat.presents_array(BinaryFormat.load_presents(presentsFilename)).astype(dtype, copy=False)
+    key = file_key(presentsFilename)
+    cacheFilename = cache_filename(presentsFilename)
+    presents = read_cache(cacheFilename, key, dtype)
+    if presents is None:
+        presents = Formats.read_int_csv(presentsFilename, 4, dtype)
+        write_cache(cacheFilename, key, presents)
+    return presents
+
+def load_sorted_presents(presentsFilename, dtype=np.int64):
+    """ sort_presents of the presents file """
+    return sort_presents(load_presents(presentsFilename, dtype))
+
+def iter_blocks(rows, first=0, reverse=False):
+    """ Yields the rows of a 2D array as lists of lists of ints, a block of at most
+    BLOCK_ROWS rows at a time, from row first on (or down to it if reverse).
+    """
+    starts = range(first, len(rows), BLOCK_ROWS)
+    if reverse:
+        starts.reverse()
+    for start in starts:
+        block = rows[start:start + BLOCK_ROWS].tolist()
+        if reverse:
+            block.reverse()
+        yield block
+
+def iter_rows(rows, first=0, reverse=False):
+    """ Yields the rows of a 2D array as lists of ints, from row first on (or down
+    to it if reverse), converting a block of rows at a time.
+    """
+    for block in iter_blocks(rows, first, reverse):
+        for row in block:
+            yield row
+
+def read_presents_rows(presentsFilename, first=0, reverse=False):
+    """ Yields the rows of the presents file as [PresentId, Dimension1, Dimension2,
+    Dimension3] lists of ints, skipping the first rows (or in reverse order).
+    """
+    return iter_rows(load_presents(presentsFilename), first, reverse)
+
+def read_sorted_rows(presentsFilename, first=0):
+    """ Yields [PresentId, width, height, z_depth, area] lists of ints, the dimensions
+    in increasing order and area = width * height, skipping the first rows.
+    """
+    presents, areas = load_sorted_presents(presentsFilename)
+    return iter_rows(np.column_stack((presents, areas)), first)
@@ -13,7 +13,10 @@ Approach:
 """
 
 import os
-import csv
+import sys
+
+import PresentsLoader
+from SubmissionWriter import SubmissionWriter
 
 SLEIGH_LENGTH = 1000
 
@@ -65,33 +68,6 @@ def simple_packing(cursor, present):
 
     return [x1, x2, y1, y2, z1, z2]
 
-def pack_present(cursor, present):
-    """ 
-    Vertex convention: x1 y1 z1
-                       x1 y2 z1
-                       x2 y1 z1
-                       x2 y2 z1
-                       x1 y1 z2
-                       x1 y2 z2
-                       x2 y1 z2
-                       x2 y2 z2
-    Arguments:
-        sleigh: 3D tensor representing the sleigh
-        present: row from the present file: id, length_x, length_y, length_z
-    Returns:
-        list_vertices: list of the 8 vertices of the packed present
-    """
-    [x1, x2, y1, y2, z1, z2] = simple_packing(cursor, present)
-    list_vertices = [x1, y1, z1]
-    list_vertices += [x1, y2, z1]
-    list_vertices += [x2, y1, z1]
-    list_vertices += [x2, y2, z1]
-    list_vertices += [x1, y1, z2]
-    list_vertices += [x1, y2, z2]
-    list_vertices += [x2, y1, z2]
-    list_vertices += [x2, y2, z2]
-    return list_vertices    
-
 class Cursor:
     """ Object to keep track of present position and max extent in sleigh so far. """    
     def __init__(self):
@@ -107,21 +83,20 @@ class Cursor:
 if __name__ == "__main__":
     
     path = '.'
+    binary = '--binary' in sys.argv[1:]
+    presentsFilename = os.path.join(path, 'presents.npy')
     reverseOrderedPresentsFilename = os.path.join(path, 'presents_revorder.csv')
     submissionFilename = os.path.join(path, 'sampleSubmission_bottomPacking.csv')
-    
-    # create header for submission file: PresentId, x1,y1,z1, ... x8,y8,z8
-    header = ['PresentId']
-    for i in xrange(1,9):
-        header += ['x' + str(i), 'y' + str(i), 'z' + str(i)]
+    if '--gzip' in sys.argv[1:]:
+        submissionFilename += '.gz'
      
     myCursor = Cursor()
-    with open(reverseOrderedPresentsFilename, 'rb') as f:
-        with open(submissionFilename, 'wb') as w:
-            f.readline() # header
-            fcsv = csv.reader(f)
-            wcsv = csv.writer(w)
-            wcsv.writerow(header)
-            for row in fcsv:
-                wcsv.writerow([row[0]] + pack_present(myCursor, row))
+    if binary:
+        # presents.npy read backwards instead of presents_revorder.csv
+        rows = PresentsLoader.read_presents_rows(presentsFilename, reverse=True)
+    else:
+        rows = PresentsLoader.read_presents_rows(reverseOrderedPresentsFilename)
+    with SubmissionWriter(submissionFilename) as writer:
+        for row in rows:
+            writer.append(int(row[0]), *simple_packing(myCursor, row))
     print 'Done'
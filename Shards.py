@@ -0,0 +1,239 @@
+# -*- coding: utf-8 -*-
+"""
+Packing Santa's Sleigh -- Sharded TopDownOffline
+Splits the presents into contiguous ranges of ids (shards), packs each shard
+independently with TopDownOffline from z = 1, then stacks the packed shards in
+order of id, each one on top of the previous one: the first layer of a shard is
+compacted onto the last layer of the previous shard, as TopDownOffline does
+between two layers, and z is flipped when writing, so the first ids end on top.
+
+The shards go through a directory: the coordinator writes shard_K.npz files,
+and a worker claims a shard by creating shard_K.npz.lock, packs it and writes
+packed_K.npz. Workers are local processes (--jobs N), and other machines can
+share the work by running a worker on the same directory once the shards are
+written. A worker touches the lock of its shard every HEARTBEAT_SECONDS; a lock
+left untouched for LOCK_TIMEOUT seconds is taken to belong to a dead worker, and
+the shard is packed again by the next worker, or by the coordinator, which packs
+the shards left once its local workers are done.
+
+Usage: python Shards.py [--binary] [--engine ENGINE] [--shards K] [--jobs N] [--dir DIR] [--gzip]
+       python Shards.py --worker DIR
+"""
+
+import os
+import sys
+import glob
+import time
+import socket
+import threading
+import multiprocessing
+
+import numpy as np
+
+import TopDownOffline
+from PresentTable import PresentTable
+from SubmissionWriter import SubmissionWriter
+
+SHARD_DIRECTORY = 'shards'
+POLL_SECONDS = 1.0
+HEARTBEAT_SECONDS = 10.0 # a worker touches the lock of its shard this often
+LOCK_TIMEOUT = 120.0 # a lock untouched for this long was left by a dead worker (allow for clock skew)
+REPORT_SECONDS = 60.0 # the coordinator prints the shards it waits for this often
+
+
+def shard_filename(directory, k):
+    return os.path.join(directory, 'shard_%04d.npz' % k)
+
+def packed_filename(directory, k):
+    return os.path.join(directory, 'packed_%04d.npz' % k)
+
+def save_atomic(filename, table, **arrays):
+    """ table.save() to filename through a temporary file, so that readers never see a partial file """
+    tmpFilename = filename + '.tmp'
+    with open(tmpFilename, 'wb') as f:
+        table.save(f, **arrays)
+    os.rename(tmpFilename, filename)
+
+def shard_bounds(n, count):
+    """ (first, last) rows of count contiguous shards of n presents, first included, last excluded """
+    bounds = np.linspace(0, n, count + 1).astype(int).tolist()
+    return zip(bounds[:-1], bounds[1:])
+
+def write_shards(table, shards, directory, engine):
+    """ Replaces the shards of the directory (and their packings) with the given (first, last) rows of the table """
+    for filename in glob.glob(os.path.join(directory, '*_[0-9]*.npz*')):
+        os.remove(filename)
+    for k, (first, last) in enumerate(shards):
+        save_atomic(shard_filename(directory, k), table.take(np.arange(first, last)), engine=np.array(engine))
+
+def lock_filename(shardFilename):
+    return shardFilename + '.lock'
+
+def lock_age(lockFilename):
+    """ Seconds since the lock was last touched, or None if there is no lock """
+    try:
+        return time.time() - os.path.getmtime(lockFilename)
+    except OSError:
+        return None
+
+def claim(shardFilename):
+    """ True if this process got the shard, False if another worker has it. A stale lock
+    (see LOCK_TIMEOUT) is taken over; if two workers take it over at once, both pack the
+    shard, to the same packed file.
+    """
+    lockFilename = lock_filename(shardFilename)
+    age = lock_age(lockFilename)
+    if age is not None and age > LOCK_TIMEOUT:
+        print 'Taking over the stale lock ' + lockFilename
+        try:
+            os.remove(lockFilename)
+        except OSError:
+            pass
+    try:
+        fd = os.open(lockFilename, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except OSError:
+        return False
+    os.write(fd, '%s %d\n' % (socket.gethostname(), os.getpid()))
+    os.close(fd)
+    return True
+
+def pack_shard(shardFilename, packedFilename):
+    """ Packs the presents of a shard file with TopDownOffline, from z = 1, and writes the packed
+    table with the rows, z_base and z_max of its last layer.
+    """
+    table, data = PresentTable.load(shardFilename)
+    TopDownOffline.PACKING_ENGINE = str(data['engine'])
+    layer = TopDownOffline.Layer(1, 1, table, [])
+    layer = TopDownOffline.pack_table(table, layer, max_layers=None)
+    save_atomic(packedFilename, table,
+                last=np.asarray(layer.rows, dtype=np.int32),
+                last_layer=np.array([layer.z_base, layer.z_max], dtype=np.int64))
+
+def heartbeat(lockFilename, stop):
+    """ Touches the lock every HEARTBEAT_SECONDS until stop is set """
+    while not stop.wait(HEARTBEAT_SECONDS):
+        try:
+            os.utime(lockFilename, None)
+        except OSError:
+            pass
+
+def work(directory):
+    """ Packs the shards of the directory that are not packed and that no live worker has
+    claimed, until there are none left
+    """
+    for shardFilename in sorted(glob.glob(os.path.join(directory, 'shard_*.npz'))):
+        k = int(os.path.basename(shardFilename)[len('shard_'):-len('.npz')])
+        if os.path.exists(packed_filename(directory, k)) or not claim(shardFilename):
+            continue
+        print 'Packing ' + shardFilename
+        stop = threading.Event()
+        thread = threading.Thread(target=heartbeat, args=(lock_filename(shardFilename), stop))
+        thread.daemon = True
+        thread.start()
+        try:
+            pack_shard(shardFilename, packed_filename(directory, k))
+        finally:
+            stop.set()
+            thread.join()
+
+def wait_packed(directory, count, workers):
+    """ Waits until the count shards of the directory are packed, by workers or other machines.
+    Once the local workers are done, packs the shards left that no live worker has claimed, and
+    prints the shards still missing every REPORT_SECONDS.
+    """
+    report = time.time() + REPORT_SECONDS
+    while True:
+        if all(worker.exitcode == 0 for worker in workers):
+            work(directory)
+        missing = [k for k in xrange(count) if not os.path.exists(packed_filename(directory, k))]
+        if not missing:
+            return
+        if any(worker.exitcode not in (None, 0) for worker in workers):
+            print 'A worker failed, shards not packed: ' + ', '.join(map(str, missing))
+            exit()
+        if time.time() > report:
+            states = []
+            for k in missing:
+                age = lock_age(lock_filename(shard_filename(directory, k)))
+                states.append('%d (%s)' % (k, 'unclaimed' if age is None else 'lock touched %ds ago' % age))
+            print 'Waiting for shards ' + ', '.join(states)
+            report = time.time() + REPORT_SECONDS
+        time.sleep(POLL_SECONDS)
+
+def stitch(table, shards, directory):
+    """ Takes the packings of the shards into the table, stacked in order: each shard starts just
+    above the top of the previous one, and its first layer (its presents at z = 1) is compacted
+    onto the last layer of the previous shard. Records the presents in order and returns maxz.
+    """
+    z_max = 0
+    prev_layer = None
+    for k, (first, last) in enumerate(shards):
+        if first == last:
+            continue
+        packed, data = PresentTable.load(packed_filename(directory, k))
+        rows = np.arange(first, last)
+        for name in PresentTable.STATE_FIELDS:
+            getattr(table, name)[rows] = getattr(packed, name)
+        table.zpos[rows] += z_max
+        table.record(first + np.frombuffer(packed.recorded, dtype=np.int32))
+
+        layer = TopDownOffline.Layer(k, z_max + 1, table, first + packed.sort_by_id(np.flatnonzero(packed.zpos == 1)))
+        if prev_layer is not None:
+            layer.compact(prev_layer)
+        z_base, shard_z_max = data['last_layer'].tolist()
+        prev_layer = TopDownOffline.Layer(k, z_max + z_base, table, first + data['last'])
+        prev_layer.z_max = max([prev_layer.z_base] + table.tops(prev_layer.rows).tolist())
+        z_max = prev_layer.z_max
+    return z_max
+
+
+if __name__ == "__main__":
+
+    if '--worker' in sys.argv[1:]:
+        work(sys.argv[sys.argv.index('--worker') + 1])
+        exit()
+
+    path = '.'
+    binary = '--binary' in sys.argv[1:]
+    engine = TopDownOffline.PACKING_ENGINE
+    if '--engine' in sys.argv[1:]:
+        engine = sys.argv[sys.argv.index('--engine') + 1]
+        if engine not in TopDownOffline.ENGINES:
+            print 'Unknown engine ' + engine + ', expected one of ' + ', '.join(TopDownOffline.ENGINES)
+            exit()
+    jobs = multiprocessing.cpu_count()
+    if '--jobs' in sys.argv[1:]:
+        jobs = int(sys.argv[sys.argv.index('--jobs') + 1])
+    count = jobs
+    if '--shards' in sys.argv[1:]:
+        count = int(sys.argv[sys.argv.index('--shards') + 1])
+    directory = SHARD_DIRECTORY
+    if '--dir' in sys.argv[1:]:
+        directory = sys.argv[sys.argv.index('--dir') + 1]
+    presentsFilename = os.path.join(path, 'presents.npy' if binary else 'presents.csv')
+    submissionFilename = os.path.join(path, 'test.csv')
+    if '--gzip' in sys.argv[1:]:
+        submissionFilename += '.gz'
+
+    table = PresentTable.from_file(presentsFilename)
+    shards = shard_bounds(len(table), count)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    write_shards(table, shards, directory, engine)
+    print 'Wrote %d shards to %s' % (count, directory)
+
+    workers = [multiprocessing.Process(target=work, args=(directory,)) for _ in xrange(jobs)]
+    for worker in workers:
+        worker.start()
+    wait_packed(directory, count, workers)
+    for worker in workers:
+        worker.join()
+
+    maxz = stitch(table, shards, directory)
+    print "Max z =", maxz
+
+    print "Writing file"
+    with SubmissionWriter(submissionFilename) as writer:
+        table.write(writer, maxz)
+
+    print 'Done'
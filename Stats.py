@@ -0,0 +1,98 @@
+# -*- coding: utf-8 -*-
+"""
+Packing Santa's Sleigh -- Run statistics
+Time spent per phase, counters of the hot paths and per-layer figures of a
+packing run, exported as JSON or CSV at the end:
+
+    stats = Stats.Stats(enabled=True)
+    with stats.timer('compact'):
+        layer.compact(prev_layer)
+    stats.count('rotations')
+    stats.record_layer(layer.id, fill=0.93, leftovers=12)
+    stats.save('stats.json')
+
+A disabled Stats does nothing: timer() returns a shared no-op context, so the
+instrumentation can stay in place.
+"""
+
+import csv
+import json
+import time
+
+
+class NoTimer:
+    """ Context that does nothing, for disabled stats. """
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+NO_TIMER = NoTimer()
+
+
+class Timer:
+    """ Context adding its wall time to a phase of the stats. """
+    def __init__(self, stats, name):
+        self.stats = stats
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *args):
+        self.stats.add_time(self.name, time.time() - self.start)
+        return False
+
+
+class Stats:
+    """ Seconds per phase, counters and per-layer records. """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.times = {}
+        self.counters = {}
+        self.layers = []
+
+    def add_time(self, name, seconds):
+        self.times[name] = self.times.get(name, 0.0) + seconds
+
+    def timer(self, name):
+        """ Context timing a phase: with stats.timer('pack'): ... """
+        if not self.enabled:
+            return NO_TIMER
+        return Timer(self, name)
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def record_layer(self, layerId, **fields):
+        """ Per-layer figures, e.g. fill ratio and leftovers """
+        if self.enabled:
+            fields['layer'] = layerId
+            self.layers.append(fields)
+
+    def to_dict(self):
+        return {'times': self.times, 'counters': self.counters, 'layers': self.layers}
+
+    def save(self, filename):
+        """ Writes the stats as CSV if filename ends with .csv, as JSON otherwise.
+        CSV rows are kind (time, count or layer), name, layer, value.
+        """
+        if filename.endswith('.csv'):
+            with open(filename, 'wb') as f:
+                writer = csv.writer(f)
+                writer.writerow(['kind', 'name', 'layer', 'value'])
+                for name in sorted(self.times):
+                    writer.writerow(['time', name, '', self.times[name]])
+                for name in sorted(self.counters):
+                    writer.writerow(['count', name, '', self.counters[name]])
+                for fields in self.layers:
+                    for name in sorted(fields):
+                        if name != 'layer':
+                            writer.writerow(['layer', name, fields['layer'], fields[name]])
+        else:
+            with open(filename, 'wb') as f:
+                json.dump(self.to_dict(), f, indent=1, sort_keys=True)
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+"""
+Packing Santa's Sleigh -- Submission writer
+Writes submission files from arrays of min/max corners, a block of rows at a
+time, with the same bytes as csv.writer writing the rows one by one; the file
+is gzipped if its name ends with .gz.
+
+    with SubmissionWriter('submission.csv') as writer:
+        writer.write_bounds(presentIds, x1, x2, y1, y2, z1, z2)
+"""
+
+import gzip
+
+import numpy as np
+
+import Pipeline
+
+HEADER = ['PresentId'] + ['%s%d' % (axis, i) for i in xrange(1, 9) for axis in 'xyz']
+BLOCK_ROWS = 4096 # rows formatted at once, as 25 Python ints each
+# csv.writer writes ints with str() and ends lines with '\r\n'
+ROW_FORMAT = ','.join(['%s'] * len(HEADER)) + '\r\n'
+GZIP_LEVEL = 6
+
+
+def vertices(presentIds, x1, x2, y1, y2, z1, z2):
+    """ Array (N, 25) of submission rows, with the vertex convention of the sample submission:
+        x1 y1 z1
+        x1 y2 z1
+        x2 y1 z1
+        x2 y2 z1
+        x1 y1 z2
+        x1 y2 z2
+        x2 y1 z2
+        x2 y2 z2
+    """
+    return np.column_stack((presentIds,
+                            x1, y1, z1, x1, y2, z1, x2, y1, z1, x2, y2, z1,
+                            x1, y1, z2, x1, y2, z2, x2, y1, z2, x2, y2, z2))
+
+
+class SubmissionWriter:
+    """ Submission file, with its header. With background=True, the file is written
+    (and compressed) by a writer thread while the next rows are formatted.
+    """
+
+    def __init__(self, filename, background=False):
+        if filename.endswith('.gz'):
+            self.f = gzip.open(filename, 'wb', GZIP_LEVEL)
+        else:
+            self.f = open(filename, 'wb')
+        if background:
+            self.f = Pipeline.BackgroundWriter(self.f)
+        self.f.write(','.join(HEADER) + '\r\n')
+        self.pending = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+        return False
+
+    def write_rows(self, rows):
+        """ Writes an array (N, 25) of submission rows """
+        for start in xrange(0, len(rows), BLOCK_ROWS):
+            block = rows[start:start + BLOCK_ROWS]
+            self.f.write((ROW_FORMAT * len(block)) % tuple(block.ravel().tolist()))
+
+    def write_bounds(self, presentIds, x1, x2, y1, y2, z1, z2):
+        """ Writes the presents of a layer or chunk, from arrays of ids and corners """
+        self.flush()
+        for start in xrange(0, len(presentIds), BLOCK_ROWS):
+            end = start + BLOCK_ROWS
+            self.write_rows(vertices(*[np.asarray(a[start:end], dtype=np.int64)
+                                       for a in (presentIds, x1, x2, y1, y2, z1, z2)]))
+
+    def append(self, presentId, x1, x2, y1, y2, z1, z2):
+        """ Writes one present, buffered until BLOCK_ROWS presents are pending """
+        self.pending.append((presentId, x1, x2, y1, y2, z1, z2))
+        if len(self.pending) >= BLOCK_ROWS:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            columns = np.array(self.pending, dtype=np.int64)
+            self.pending = []
+            self.write_rows(vertices(*columns.T))
+
+    def close(self):
+        self.flush()
+        self.f.close()
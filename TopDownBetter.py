@@ -8,16 +8,22 @@ Approach:
 """
 
 import os
-import csv
+import sys
+from array import array
 from matplotlib import cm
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
 
+import Stats
+from PresentTable import PresentTable
+from SubmissionWriter import SubmissionWriter
+
 SLEIGH_LENGTH = 1000
 #MAX_LAYERS = 4 
 MAX_LAYERS = 999999 
 PLOT = False
 WRITE = True
+stats = Stats.Stats() # enabled with --stats FILE
 
 # Plotting
 xpos, ypos, zpos, dx, dy, dz = [],[],[],[],[],[]
@@ -25,25 +31,30 @@ colors = []
 
 class Layer:
    """ Object to keep track of present position and max extent in sleigh so far. """    
-   def __init__(self, id, zbase):
+   def __init__(self, id, zbase, table):
         self.id = id
         self.z_base = zbase 
         self.z_max = zbase 
-        self.presents = []
-        self.tree = Tree()
-
-   """ Add present to layer """
-   def add_present(self, present):
-      coordinates = max_rect_packing(self.tree, present, self)
-      if coordinates is None:
+        self.table = table
+        self.rows = [] # rows of the presents of the layer in the table
+        self.tops = None # height map, once the shelf is final
+        self.tree = TREE
+        self.tree.reset()
+
+   """ Add present (row of the table) to layer """
+   def add_present(self, row, width, height, z_depth):
+      position = max_rect_packing(self.tree, row, width, height)
+      if position is None:
          return False
-      else:
-         [x1, x2, y1, y2, z1, z2] = coordinates
-      present.xpos = min(x1,x2)
-      present.ypos = min(y1,y2)
-      present.zpos = min(z1,z2)
-      self.presents.append(present)
-      self.z_max = max(self.z_max, present.zpos + present.z_depth - 1)
+      [xpos, ypos, width, height] = position
+      t = self.table
+      t.xpos[row] = xpos
+      t.ypos[row] = ypos
+      t.zpos[row] = self.z_base
+      t.width[row] = width
+      t.height[row] = height
+      self.rows.append(row)
+      self.z_max = max(self.z_max, self.z_base + z_depth - 1)
       return True
 
 
@@ -51,39 +62,18 @@ class Layer:
    def next_shelf(self):
       return
 
-   """ Copy presents and sort them decreasingly by tallest z-point they reach (if no compactor, the z_pos term is all the same (z_base), but otherwise it's not). """
-   def sort_presents(self):
-      self.sorted_presents = list(self.presents)
-      self.sorted_presents.sort(key= lambda p : (p.zpos+p.z_depth-1), reverse=True)
-      return self.sorted_presents
+   """ Height map of the shelf: for each (x, y) of the sleigh floor, the top z of the present above it (0 if none). """
+   def top_map(self):
+      if self.tops is None:
+         self.tops = self.table.top_map(self.rows, SLEIGH_LENGTH)
+      return self.tops
      
-   """ Compactor """
+   """ Compactor: move the presents down onto the previous shelf, in order of id,
+   never below a present before them """
    def compact(self, prev_layer):
-      #prev_layer.z_base # do not exceed
-      #print "Layer", self.id
-      z_min = prev_layer.z_base-1 #z_min up to current present. then, following presents must not be smaller, they can be equal or greater.
-
+      self.table.compact(self.rows, prev_layer.top_map(), prev_layer.z_base-1)
       # recompute z_max
-      self.z_max = self.z_base
-      
-      for p in self.presents: #in order of id!
-         # presents in the previous layer sorted by decreasing z-height
-         for up_p in prev_layer.sort_presents():
-            if p.overlap(up_p):
-               # this is the tallest overlapping present: you can move down the present, if possible. 
-               # if not possible, break!
-               diff = p.zpos - (up_p.zpos+up_p.z_depth)
-               if diff > 0 and (p.zpos - diff) >= z_min:
-#                  print "good overlap", p.id, diff
-#                  print "previous pos", p.zpos
-                  p.zpos -= diff
-#                  print "new pos", p.zpos
-                  z_min = max(p.zpos, z_min)
-               break
-         z_min = max(p.zpos, z_min)
-         #print "zmin", z_min
-         self.z_max = max(self.z_max, p.zpos + p.z_depth - 1)
-      
+      self.z_max = max([self.z_base] + self.table.tops(self.rows).tolist())
       return
 
 
@@ -91,229 +81,249 @@ class Layer:
    def finalize_shelf(self):
       #fracs = offset.astype(float)/offset.max()
       #norm = colors.normalize(fracs.min(), fracs.max())
-      for i,p in enumerate(self.presents):
-         if self.id <= MAX_LAYERS:
-            x1, x2, y1, y2, z1, z2 = p.xpos, p.xpos+p.width-1, p.ypos, p.ypos + p.height-1, p.zpos, p.zpos + p.z_depth-1
-            xpos.append(min(x1,x2))
-            ypos.append(min(y1,y2))
-            zpos.append(min(z1,z2))
-            dx.append(abs(x1-x2))
-            dy.append(abs(y1-y2))
-            dz.append(abs(z1-z2))
-            colors.append(cm.jet(float(i)/len(self.presents)))
+      if self.id <= MAX_LAYERS:
+         bounds = zip(*[a.tolist() for a in self.table.bounds(self.rows)])
+         for i, (x1, x2, y1, y2, z1, z2) in enumerate(bounds):
+            xpos.append(x1)
+            ypos.append(y1)
+            zpos.append(z1)
+            dx.append(x2-x1)
+            dy.append(y2-y1)
+            dz.append(z2-z1)
+            colors.append(cm.jet(float(i)/len(self.rows)))
 
    """ Reflect x and y axis """ 
    def reflect_shelf(self):
       #print "Flipping layer", self.id
-      for p in self.presents:
-         p.xpos = 1 + SLEIGH_LENGTH - (p.xpos + p.width - 1)
-         p.ypos = 1 + SLEIGH_LENGTH - (p.ypos + p.height - 1)
-         
+      self.table.reflect(self.rows, SLEIGH_LENGTH)
 
 
-   """ Write next line """
+   """ Record the placements of the shelf, to be written once maxz is known """
+   def record_shelf(self):
+      self.table.record(self.rows)
+
+   """ Presents, fill ratio and height of the shelf, for the stats """
+   def record_stats(self):
+      if stats.enabled:
+         stats.record_layer(self.id, presents=len(self.rows),
+                            fill=int(self.table.area[self.rows].sum()) / float(SLEIGH_LENGTH*SLEIGH_LENGTH),
+                            z_base=self.z_base, z_max=self.z_max)
+
+   """ Write the shelf with a SubmissionWriter """
    def write_shelf(self, writer, maxz):
-      for p in self.presents:
-         x1, x2, y1, y2, z1, z2 = p.xpos, p.xpos+p.width-1, p.ypos, p.ypos + p.height-1, p.zpos, p.zpos + p.z_depth-1
-         z1 = maxz - z1 + 1
-         z2 = maxz - z2 + 1
-
-         list_vertices = [x1, y1, z1]
-         list_vertices += [x1, y2, z1]
-         list_vertices += [x2, y1, z1]
-         list_vertices += [x2, y2, z1]
-         list_vertices += [x1, y1, z2]
-         list_vertices += [x1, y2, z2]
-         list_vertices += [x2, y1, z2]
-         list_vertices += [x2, y2, z2]
-         writer.writerow([p.id] + list_vertices)
+      self.table.write(writer, maxz, self.rows)
       return 
 
 class Tree:
-   def __init__(self):
-      self.root = Node()
-
-class Present:
-   def __init__(self, row):
-      self.id = int(row[0])
-      dim = [int(x) for x in row[1:]]
-      dim.sort()
-      self.width = dim[0]     # along x-axis 
-      self.height = dim[1]    # along y-axis
-      self.z_depth = dim[2]   # along z-axis
-      self.area = self.width * self.height
-      self.xpos = 0
-      self.ypos = 0
-      self.zpos = 0
-  
-   # rotate on the x-y plane
-   def rotate(self):
-      self.width, self.height = self.height, self.width
-      # should also change positions? it's not univocal.
-
-   def overlap(self, present):
-      # make sure that positions are good, not 0's!
-
-      if (self.xpos+self.width-1) < present.xpos:
-         return False
-      if self.xpos > (present.xpos+present.width-1):
-         return False
-      if (self.ypos+self.height-1) < present.ypos:
-         return False
-      if self.ypos > (present.ypos+present.height-1): 
-         return False
-      return True
-      
+   """ Guillotine tree of a layer, in preallocated columns indexed by node: node 0 is the root,
+   the children of a node are child[node] and child[node]+1 (child[node] is 0 for a leaf).
+   max_width and max_height are the largest free width and height in the subtree of a node
+   (0 if it is full): a subtree can only take a present if both are large enough.
+   reset() empties the tree for the next layer, keeping the storage. """
+   CAPACITY = 4096
+   COLUMNS = ['xpos', 'ypos', 'width', 'height', 'max_width', 'max_height', 'child', 'parent', 'id']
 
-class Node:
    def __init__(self):
-      self.child = [None, None]
-      self.xpos = SLEIGH_LENGTH 
-      self.ypos = SLEIGH_LENGTH 
-      self.width = SLEIGH_LENGTH 
-      self.height = SLEIGH_LENGTH 
-      self.id = None
-
-   def insert(self, present):
-      # if not leaf, DFS leftmost child
-      if self.child[0] is not None and self.child[1] is not None:
-         newNode = self.child[0].insert(present)
-         if newNode is not None:
-            return newNode
-         return self.child[1].insert(present)
-      
-      # if it's a leaf
-      else:
-         # if the space is occupied
-         if self.id is not None:
-            return None
-        
-         # if the space is too small
-#         if self.width < present.width or self.height < present.height:
-#            present.rotate()
-         if self.width < present.width or self.height < present.height:
-#            present.rotate() #rotate it back
-            return None
-
-         # if the space is perfect
-         if self.width == present.width and self.height == present.height:
-            self.id = present.id
-            return self
-
-         # if the space is larger,
-         # split the space 
-         self.child[0] = Node()
-         self.child[1] = Node()
-
-         dw = self.width - present.width
-         dh = self.height - present.height
+      for name in self.COLUMNS:
+         setattr(self, name, array('i'))
+      self.size = 0
+      self.grow(self.CAPACITY)
+      self.reset()
+
+   def grow(self, size):
+      """ Room for size nodes """
+      for name in self.COLUMNS:
+         getattr(self, name).extend([0] * (size - self.size))
+      self.size = size
+
+   def reset(self):
+      """ Only the root, free: the whole sleigh floor """
+      self.count = 1
+      self.xpos[0] = SLEIGH_LENGTH
+      self.ypos[0] = SLEIGH_LENGTH
+      self.width[0] = SLEIGH_LENGTH
+      self.height[0] = SLEIGH_LENGTH
+      self.max_width[0] = SLEIGH_LENGTH
+      self.max_height[0] = SLEIGH_LENGTH
+      self.child[0] = 0
+      self.parent[0] = -1
+      self.id[0] = -1
+
+   def insert(self, width, height, id):
+      """ Put a width x height present in the first free leaf large enough, return that leaf or None """
+      # DFS leftmost child first, skipping the subtrees that cannot fit the present
+      max_width, max_height, child = self.max_width, self.max_height, self.child
+      stack = [0]
+      visits = 0
+      while stack:
+         node = stack.pop()
+         visits += 1
+         if max_width[node] < width or max_height[node] < height:
+            continue
+         # if not leaf, visit children
+         first = child[node]
+         if first:
+            stack.append(first + 1)
+            stack.append(first)
+            continue
+         # free leaf large enough
+         leaf = self.split(node, width, height)
+         self.id[leaf] = id
+         self.update_free_space(leaf)
+         stats.count('insert_visits', visits)
+         return leaf
+      stats.count('insert_visits', visits)
+      return None
+
+   def split(self, node, width, height):
+      """ Split a free leaf until the first child is width x height, return that child """
+      # if the space is larger, split the space
+      while self.width[node] != width or self.height[node] != height:
+         if self.count + 2 > self.size:
+            self.grow(2*self.size)
+         xpos, ypos, widths, heights = self.xpos, self.ypos, self.width, self.height
+         first = self.count
+         second = first + 1
+         self.count += 2
+         self.child[node] = first
+         self.child[first] = self.child[second] = 0
+         self.parent[first] = self.parent[second] = node
+
+         dw = widths[node] - width
+         dh = heights[node] - height
 
          # cut vertically 
          if dw > dh:
-            self.child[0].xpos = self.xpos
-            self.child[0].ypos = self.ypos
-            self.child[0].width = present.width
-            self.child[0].height = self.height
+            xpos[first] = xpos[node]
+            ypos[first] = ypos[node]
+            widths[first] = width
+            heights[first] = heights[node]
             
-            self.child[1].xpos = self.xpos - present.width
-            self.child[1].ypos = self.ypos
-            self.child[1].width = self.width - present.width
-            self.child[1].height = self.height
+            xpos[second] = xpos[node] - width
+            ypos[second] = ypos[node]
+            widths[second] = widths[node] - width
+            heights[second] = heights[node]
          # cut horizontally
          else:
-            self.child[0].xpos = self.xpos
-            self.child[0].ypos = self.ypos
-            self.child[0].width = self.width 
-            self.child[0].height = present.height
+            xpos[first] = xpos[node]
+            ypos[first] = ypos[node]
+            widths[first] = widths[node]
+            heights[first] = height
             
-            self.child[1].xpos = self.xpos
-            self.child[1].ypos = self.ypos - present.height
-            self.child[1].width = self.width 
-            self.child[1].height = self.height - present.height
-
-         # insert in first child
-         return self.child[0].insert(present)
+            xpos[second] = xpos[node]
+            ypos[second] = ypos[node] - height
+            widths[second] = widths[node]
+            heights[second] = heights[node] - height
 
+         for n in (first, second):
+            self.max_width[n] = widths[n]
+            self.max_height[n] = heights[n]
 
-""" Try to pack a present in this layer """ #TODO better packing!
-def max_rect_packing(tree, present, layer):
-   leaf = tree.root.insert(present)
+         # insert in first child
+         node = first
+      return node
+
+   def update_free_space(self, leaf):
+      """ Mark an occupied leaf and update the largest free width and height up to the root """
+      max_width, max_height, child, parent = self.max_width, self.max_height, self.child, self.parent
+      max_width[leaf] = 0
+      max_height[leaf] = 0
+      node = parent[leaf]
+      while node >= 0:
+         first = child[node]
+         w = max(max_width[first], max_width[first + 1])
+         h = max(max_height[first], max_height[first + 1])
+         if w == max_width[node] and h == max_height[node]:
+            break
+         max_width[node] = w
+         max_height[node] = h
+         node = parent[node]
+
+TREE = Tree() # reset and reused by each layer
+
+
+""" Try to pack a present (row of the table) in this layer, rotating it if it does not fit.
+Returns [xpos, ypos, width, height] of its min corner and footprint, or None """ #TODO better packing!
+def max_rect_packing(tree, row, width, height):
+   leaf = tree.insert(width, height, row)
    #print tree
    if leaf is None:
-      present.rotate()
-      leaf = tree.root.insert(present)
+      stats.count('rotations')
+      width, height = height, width
+      leaf = tree.insert(width, height, row)
 
    if leaf is None:
-      # Really no space! Rotate it back
-      present.rotate()
+      # Really no space!
       return None
       #open a new layer!
       #layer.z_base = layer.z_max + 1
-      #tree.root = Node()
-      #leaf = tree.root.insert(present)
-
-   x1 = leaf.xpos
-   x2 = leaf.xpos - leaf.width + 1
-   y1 = leaf.ypos
-   y2 = leaf.ypos - leaf.height + 1 
-   z1 = layer.z_base 
-   z2 = z1 + present.z_depth - 1
+      #tree.reset()
+      #leaf = tree.insert(width, height, row)
 
-   return [x1, x2, y1, y2, z1, z2]
+   return [tree.xpos[leaf] - width + 1, tree.ypos[leaf] - height + 1, width, height]
 
 
 if __name__ == "__main__":
     
    path = '.'
-   presentsFilename = os.path.join(path, 'presents.csv')
+   binary = '--binary' in sys.argv[1:]
+   if '--stats' in sys.argv[1:]:
+      stats.enabled = True
+   presentsFilename = os.path.join(path, 'presents.npy' if binary else 'presents.csv')
    submissionFilename = os.path.join(path, 'test.csv')
-   
-   # create header for submission file: PresentId, x1,y1,z1, ... x8,y8,z8
-   header = ['PresentId']
-   for i in xrange(1,9):
-       header += ['x' + str(i), 'y' + str(i), 'z' + str(i)]
+   if '--gzip' in sys.argv[1:]:
+      submissionFilename += '.gz'
     
-   layer = Layer(1,1)
+   # presents as columns; placements are recorded layer by layer and written once maxz is known
+   with stats.timer('parse'):
+      table = PresentTable.from_file(presentsFilename)
+   layer = Layer(1,1,table)
    prev_layer = None
    maxz = 1
-   with open(presentsFilename, 'rb') as f:
-      f.readline() # header
-      fcsv = csv.reader(f)
-      cumul_area = 0
-      for row in fcsv:
-         if int(row[0])%10000 == 0:
-           print row[0]
-
-         present = Present(row)
-         
-         packed_present = False
-         if cumul_area + present.area < SLEIGH_LENGTH*SLEIGH_LENGTH:
-            cumul_area += present.area
-            packed_present = layer.add_present(present) 
-         
-         if not packed_present:
-            #print layer.id, present.id, float(present.id)/layer.id
-            if layer.id % 2 == 0:
+   cumul_area = 0
+   for [row, id, width, height, z_depth, area] in table.iter_presents():
+      if id%10000 == 0:
+        print id
+
+      packed_present = False
+      if cumul_area + area < SLEIGH_LENGTH*SLEIGH_LENGTH:
+         cumul_area += area
+         with stats.timer('add_present'):
+            packed_present = layer.add_present(row, width, height, z_depth) 
+
+      if not packed_present:
+         #print layer.id, id, float(id)/layer.id
+         if layer.id % 2 == 0:
+            with stats.timer('reflect_shelf'):
                layer.reflect_shelf()
-            # compact shelf down (if possible), preserving order
-            if prev_layer is not None:
+         # compact shelf down (if possible), preserving order
+         if prev_layer is not None:
+            with stats.timer('compact'):
                layer.compact(prev_layer)
-            
-            # store coordinates for plotting
-            if PLOT:
-               layer.finalize_shelf()
-            
-            # open new shelf and add current present
-            cumul_area = 0
-            prev_layer = layer
-            if layer.id >= MAX_LAYERS:
-               break
-            layer = Layer(prev_layer.id+1, prev_layer.z_max+1)
-            packed_present = layer.add_present(present)
-
-         if not packed_present:
-            print "Something wrong"
 
+         # store coordinates for plotting
+         if PLOT:
+            layer.finalize_shelf()
+
+         with stats.timer('record_shelf'):
+            layer.record_shelf()
+         layer.record_stats()
+
+         # open new shelf and add current present
+         cumul_area = 0
+         prev_layer = layer
+         if layer.id >= MAX_LAYERS:
+            break
+         layer = Layer(prev_layer.id+1, prev_layer.z_max+1, table)
+         with stats.timer('add_present'):
+            packed_present = layer.add_present(row, width, height, z_depth)
+
+      if not packed_present:
+         print "Something wrong"
+
+   # last layer has not been emptied!
+   layer.record_shelf()
+   layer.record_stats()
    maxz = layer.z_max
 
    print "Max z =", maxz
@@ -330,52 +340,12 @@ if __name__ == "__main__":
 
    if WRITE:
       print "Writing file"
-      layer = Layer(1,1)
-      prev_layer = None
-      with open(presentsFilename, 'rb') as f:
-         with open(submissionFilename, 'wb') as w:
-            f.readline() # header
-            fcsv = csv.reader(f)
-            wcsv = csv.writer(w)
-            wcsv.writerow(header)
-            
-            cumul_area = 0
-            for row in fcsv:
-               if int(row[0])%10000 == 0:
-                 print row[0]
-
-               present = Present(row)
-               
-               packed_present = False
-               if cumul_area + present.area < SLEIGH_LENGTH*SLEIGH_LENGTH:
-                  cumul_area += present.area
-                  packed_present = layer.add_present(present) 
-               
-               if not packed_present:
-                  #print layer.id, present.id, float(present.id)/layer.id
-                  if layer.id % 2 == 0:
-                     layer.reflect_shelf()
-
-                  # compact shelf down (if possible), preserving order 
-                  if prev_layer is not None:
-                     layer.compact(prev_layer)
-                  
-                  # write to file
-                  layer.write_shelf(wcsv, maxz)
-                  
-                  # open new shelf and add current present
-                  cumul_area = 0
-                  prev_layer = layer
-                  if layer.id >= MAX_LAYERS:
-                     break
-                  layer = Layer(prev_layer.id+1, prev_layer.z_max+1)
-                  packed_present = layer.add_present(present)
-
-               if not packed_present:
-                  print "Something wrong"
-
-            # last layer has not been emptied!
-            layer.write_shelf(wcsv,maxz)
+      with SubmissionWriter(submissionFilename) as writer:
+         with stats.timer('write_shelf'):
+            table.write(writer, maxz)
+
+   if stats.enabled:
+      stats.save(sys.argv[sys.argv.index('--stats') + 1])
 
 
    print 'Done'
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Packing Santa's Sleigh -- Top-down gravity packing
+Approach:
+- Pack the presents in PresentId order from z = 1 upwards; z is flipped when
+  writing, so that the first presents end up at the top of the sleigh.
+- The sleigh floor is a height field: for each (x, y), the top of the presents
+  packed above it so far. There are no layers, but a present does not drop onto
+  the presents below its footprint: it sits at the current level (below), and
+  may float above lower stacks, which keeps the order term at 0.
+- A present goes at the current level: anywhere its footprint is free at that
+  level (the height field is below it), lowest y first, then lowest x. The level
+  never decreases, so the presents are in PresentId order from the top and the
+  order term is 0.
+- If the present fits nowhere, the level rises to the next height where a part
+  of the floor becomes free.
+The free footprints are looked for on a grid of block maxima of the height
+field; the block-aligned position is then slid left and down on the height field
+itself, into the blocks that are partly used.
+
+Usage: python TopDownGravity.py [--binary]
+"""
+
+import os
+import sys
+
+import numpy as np
+
+import PresentsLoader
+from PlacementBuffer import PlacementBuffer
+from SubmissionWriter import SubmissionWriter
+
+SLEIGH_LENGTH = 1000
+
+
+class HeightField:
+    """ Top of the packed presents over the sleigh floor, with the max of each
+    BLOCK_SIZE x BLOCK_SIZE block, and the current packing level.
+    Positions are 0-based here.
+    """
+    BLOCK_SIZE = 8
+
+    def __init__(self):
+        self.blockCount = SLEIGH_LENGTH // self.BLOCK_SIZE
+        self.heights = np.zeros((SLEIGH_LENGTH, SLEIGH_LENGTH), dtype=np.int32)
+        self.blocks = np.zeros((self.blockCount, self.blockCount), dtype=np.int32)
+        self.level = 1
+        self.table = None # summed-area table of the blocks that are not free at level
+
+    def update_table(self):
+        busy = (self.blocks >= self.level).astype(np.int32)
+        self.table = np.zeros((self.blockCount + 1, self.blockCount + 1), dtype=np.int32)
+        self.table[1:, 1:] = busy.cumsum(0).cumsum(1)
+
+    def find_blocks(self, width, height):
+        """ First block (by y, then x) from which enough blocks are free at level to
+        hold a width x height footprint, or None.
+        """
+        size = self.BLOCK_SIZE
+        bw = -(-width // size)
+        bh = -(-height // size)
+        if self.table is None:
+            self.update_table()
+        t = self.table
+        # busy blocks in each window of bw x bh blocks
+        windows = t[bw:, bh:] - t[:-bw, bh:] - t[bw:, :-bh] + t[:-bw, :-bh]
+        fits = (windows == 0).T
+        k = int(fits.argmax())
+        if not fits.flat[k]:
+            return None
+        j, i = divmod(k, fits.shape[1])
+        return i, j
+
+    def find_position(self, width, height):
+        """ Position (x, y) of a width x height footprint free at level, or None. """
+        found = self.find_blocks(width, height)
+        if found is None:
+            return None
+        x = found[0] * self.BLOCK_SIZE
+        y = found[1] * self.BLOCK_SIZE
+        # slide left, then down, while the cells are free
+        lo = max(0, x - self.BLOCK_SIZE + 1)
+        if lo < x:
+            x -= self.free_run(self.heights[lo:x, y:y + height].max(axis=1))
+        lo = max(0, y - self.BLOCK_SIZE + 1)
+        if lo < y:
+            y -= self.free_run(self.heights[x:x + width, lo:y].max(axis=0))
+        return x, y
+
+    def free_run(self, tops):
+        """ Number of trailing entries of tops below level """
+        busy = np.flatnonzero(tops >= self.level)
+        if len(busy) == 0:
+            return len(tops)
+        return len(tops) - busy[-1] - 1
+
+    def place(self, x, y, width, height, top):
+        """ Puts a present of top z top on the footprint """
+        size = self.BLOCK_SIZE
+        self.heights[x:x + width, y:y + height] = top
+        bx0, bx1 = x // size, (x + width - 1) // size + 1
+        by0, by1 = y // size, (y + height - 1) // size + 1
+        if self.table is not None:
+            # top >= level: the free blocks under the present become busy,
+            # add their summed-area table to the one of the whole floor
+            sums = (self.blocks[bx0:bx1, by0:by1] < self.level).astype(np.int32).cumsum(0).cumsum(1)
+            t = self.table
+            t[bx0 + 1:bx1 + 1, by0 + 1:by1 + 1] += sums
+            t[bx1 + 1:, by0 + 1:by1 + 1] += sums[-1, :]
+            t[bx0 + 1:bx1 + 1, by1 + 1:] += sums[:, -1:]
+            t[bx1 + 1:, by1 + 1:] += sums[-1, -1]
+        self.blocks[bx0:bx1, by0:by1] = self.heights[bx0*size:bx1*size, by0*size:by1*size] \
+            .reshape(bx1 - bx0, size, by1 - by0, size).max(axis=3).max(axis=1)
+
+    def raise_level(self):
+        """ Raises the level just above the lowest block that is not free. """
+        self.level = int(self.blocks[self.blocks >= self.level].min()) + 1
+        self.table = None
+
+
+def gravity_packing(field, present):
+    """ Packs the present at the level of the height field, in the orientation
+    that goes lowest, rising the level until it fits.
+    Arguments:
+        field: HeightField of the presents packed so far
+        present: row from the present file: id, length_x, length_y, length_z
+    Returns:
+        [x1, x2, y1, y2, z1, z2]
+    """
+    width, height, depth = sorted(int(d) for d in present[1:])
+    while True:
+        best = None
+        for w, h in [(width, height), (height, width)][:1 + (width != height)]:
+            position = field.find_position(w, h)
+            if position is not None and (best is None or position[::-1] < best[1::-1]):
+                best = position + (w, h)
+        if best is not None:
+            break
+        field.raise_level()
+
+    x, y, w, h = best
+    z1 = field.level
+    z2 = z1 + depth - 1
+    field.place(x, y, w, h, z2)
+    return [x + 1, x + w, y + 1, y + h, z1, z2]
+
+
+if __name__ == "__main__":
+
+    path = '.'
+    binary = '--binary' in sys.argv[1:]
+    presentsFilename = os.path.join(path, 'presents.npy' if binary else 'presents.csv')
+    submissionFilename = os.path.join(path, 'gravity.csv')
+    if '--gzip' in sys.argv[1:]:
+        submissionFilename += '.gz'
+
+    field = HeightField()
+    placements = PlacementBuffer()
+    maxz = 1
+    for row in PresentsLoader.read_presents_rows(presentsFilename):
+        if int(row[0]) % 10000 == 0:
+            print row[0]
+        [x1, x2, y1, y2, z1, z2] = gravity_packing(field, row)
+        placements.append(int(row[0]), x1, x2, y1, y2, z1, z2)
+        maxz = max(maxz, z2)
+    print "Max z =", maxz
+    with SubmissionWriter(submissionFilename) as writer:
+        placements.write(writer, maxz)
+
+    print 'Done'
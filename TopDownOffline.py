@@ -8,16 +8,38 @@ Approach:
 """
 
 import os
-import csv
+import sys
+import time
+import bisect
+import random
+import itertools
+from array import array
+import multiprocessing
 from matplotlib import cm
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
+import numpy as np
+
+import Stats
+from PresentTable import PresentTable
+from SubmissionWriter import SubmissionWriter
 
 SLEIGH_LENGTH = 1000
 MAX_LAYERS = 1000
 #MAX_LAYERS = 999999 
 PLOT = False
 WRITE = False
+stats = Stats.Stats() # enabled with --stats FILE
+CHECKPOINT_FILE = 'checkpoint.npz' # written every N layers with --checkpoint N, read with --resume
+ENGINES = ['guillotine', 'maxrects', 'skyline', 'portfolio']
+PACKING_ENGINE = 'guillotine' # one of ENGINES
+SORT_FRACTION = 0.7 # the largest presents are packed first among this fraction of the layer
+BUDGET = None # TimeBudget of the anytime packing, with --budget SECONDS (per layer) or --run-budget SECONDS
+# (engine, sort fraction, rotation policy) tried by the 'portfolio' engine
+PORTFOLIO = [(engine, fraction, rotation)
+             for engine in ['guillotine', 'maxrects', 'skyline']
+             for fraction in [0.7, 0.5, 0.9, 1.0]
+             for rotation in ['free', 'wide', 'fixed']]
 
 # Plotting
 xpos, ypos, zpos, dx, dy, dz = [],[],[],[],[],[]
@@ -25,300 +47,313 @@ colors = []
 
 class Layer:
    """ Object to keep track of present position and max extent in sleigh so far. """    
-   def __init__(self, id, zbase, leftovers):
+   def __init__(self, id, zbase, table, leftovers):
         self.id = id
         self.z_base = zbase 
         self.z_max = zbase 
-        self.presents = []
-        self.presents.extend(leftovers)
-        self.tree = Tree()
+        self.table = table
+        self.rows = np.asarray(leftovers, dtype=np.intp).tolist() # rows of the presents of the layer in the table
+        self.tops = None # height map, once the shelf is final
+        self.rotation = 'free'
+        self.flip_splits = False # guillotine: cut the free space along the other side (see Tree.split)
 
 
-   """ Add present to layer """
-   def add_present(self, present):
-      self.presents.append(present)
-      self.z_max = max(self.z_max, layer.z_base + present.z_depth - 1)
+   """ Add present (row of the table) to layer """
+   def add_present(self, row, z_depth):
+      self.rows.append(row)
+      self.z_max = max(self.z_max, self.z_base + z_depth - 1)
       return True
 
-   """ Pack the presents """
-   def pack(self):
-      self.guillotine_pack()
-      return
-
-   def max_rect_pack(self):
-      rect = Rectangle() #entire shelf
-      self.free_rectangles = [rect]
-      self.used_rectangles = []
+   """ Pack the presents with the given engine (PACKING_ENGINE by default), return the rows of the ones that do not fit.
+   fraction and rotation are the sort fraction and the rotation policy (see pack_presents);
+   the 'portfolio' engine tries all of PORTFOLIO, in pool if given.
+   order is the packing order of the rows, by default given by fraction (see packing_order). """
+   def pack(self, engine=None, fraction=SORT_FRACTION, rotation='free', pool=None, order=None):
+      if engine is None:
+         engine = PACKING_ENGINE
+      self.rotation = rotation
+      if engine == 'portfolio':
+         return self.portfolio_pack(pool)
+      if engine == 'maxrects':
+         return self.max_rect_pack(fraction, order)
+      if engine == 'skyline':
+         return self.skyline_pack(fraction, order)
+      return self.guillotine_pack(fraction, order)
+
+   """ Pack copies of the presents with every (engine, fraction, rotation) of PORTFOLIO and keep
+   the packing with the fewest leftovers, then the lowest top, then the first in PORTFOLIO """
+   def portfolio_pack(self, pool=None):
+      rows = np.asarray(self.rows, dtype=np.intp)
+      presents = self.table.take(rows)
+      candidates = [(self.id, self.z_base, presents, engine, fraction, rotation)
+                    for engine, fraction, rotation in PORTFOLIO]
+      if pool is None:
+         results = map(pack_candidate, candidates)
+      else:
+         results = pool.map(pack_candidate, candidates)
+      best = min(xrange(len(results)), key= lambda i : (len(results[i][2]), results[i][3], i))
+      leftovers = self.apply_candidate(rows, results[best])
+      if len(rows):
+         self.z_max = max(self.z_max, self.z_base + int(presents.z_depth.max()) - 1)
+      return leftovers
 
-      sorties = int(0.7*len(self.presents))
-      tmp = self.presents[:sorties]
-      tmp.sort(key= lambda p : p.area, reverse=True)
-      tmp.extend(self.presents[sorties:])
-      self.presents = []
-      leftovers = []
-      full = False
-      for present in tmp:
-         if full == True:
-            leftovers.append(present)
-            continue
-         
-         coordinates = self.pack_present(present) 
-         
-         if coordinates is None:
-            full = True
-            leftovers.append(present)
-            continue
+   """ Take the packing of a candidate (see pack_candidate) of the presents of rows, at z_base.
+   Returns the rows of the leftovers. """
+   def apply_candidate(self, rows, result):
+      packed, placed, leftovers, top = result
+      # rows of the candidate table are the rows of the layer, in order
+      for name in PresentTable.STATE_FIELDS:
+         getattr(self.table, name)[rows] = getattr(packed, name)
+      self.rows = rows[placed]
+      if len(placed):
+         self.table.zpos[self.rows] = self.z_base
+         self.z_max = max(self.z_max, int(self.table.tops(self.rows).max()))
+      return rows[leftovers]
+
+   """ Move the layer, not packed yet, to z_base """
+   def rebase(self, z_base):
+      self.z_max += z_base - self.z_base
+      self.z_base = z_base
+
+   """ Pack the presents one by one with pack_present, the largest first
+   (but only among the first fraction of them, to keep the order term low), until one does not fit.
+   With the 'wide' rotation policy, the presents are first turned so that width >= height;
+   with 'fixed', they are never rotated.
+   The presents are packed in the given order of their rows instead if order is not None.
+   Return the rows of the presents that were not packed, in order of id. """
+   def pack_presents(self, pack_present, fraction=SORT_FRACTION, order=None):
+      t = self.table
+      rows = np.asarray(self.rows, dtype=np.intp)
+      if self.rotation == 'wide':
+         t.rotate(rows[t.width[rows] < t.height[rows]])
+      if order is None:
+         tmp = self.packing_order(rows, fraction)
+      else:
+         tmp = np.asarray(order, dtype=np.intp)
+      positions = []
+      for row, width, height in itertools.izip(tmp.tolist(), t.width[tmp].tolist(), t.height[tmp].tolist()):
+         position = pack_present(row, width, height)
+         if position is None:
+#            print "First leftover", row
+            break
+         positions.append(position)
+      packed = tmp[:len(positions)]
+      if len(positions):
+         t.xpos[packed], t.ypos[packed], t.width[packed], t.height[packed] = zip(*positions)
+         t.zpos[packed] = self.z_base
+         self.z_max = max(self.z_max, int(t.tops(packed).max()))
+      self.rows = t.sort_by_id(packed)
+      return t.sort_by_id(tmp[len(positions):])
+
+   """ Rows in packing order: the first fraction of them by decreasing area, then the others in order """
+   def packing_order(self, rows, fraction=SORT_FRACTION):
+      sorties = int(fraction*len(rows))
+      tmp = rows[:sorties]
+      return np.concatenate((tmp[np.argsort(-self.table.area[tmp], kind='mergesort')], rows[sorties:]))
+
+   """ Anytime packing: the packing of pack(engine, fraction, rotation), then until the deadline (a time.time()),
+   random changes to it, each one kept if the packing is not worse (fewer leftovers, then a lower top):
+   swapping two presents of the area-sorted part of the order and, for the guillotine engine, turning a
+   present (with the 'free' rotation policy) or cutting the free space along the other side. MaxRects and
+   skyline already keep the better orientation of each present, so turning one changes nothing there.
+   The best packing is taken.
+   Return the rows of the presents that were not packed, in order of id. """
+   def anytime_pack(self, deadline, engine=None, fraction=SORT_FRACTION, rotation='free'):
+      if engine is None:
+         engine = PACKING_ENGINE
+      self.rotation = rotation
+      rows = np.asarray(self.rows, dtype=np.intp)
+      presents = self.table.take(rows)
+      n = len(rows)
+      sorties = int(fraction*n)
+      moves = []
+      if sorties > 1:
+         moves.append('swap')
+      if engine == 'guillotine':
+         if rotation == 'free' and n:
+            moves.append('turn')
+         moves.append('split')
+      order = Layer(self.id, self.z_base, presents, []).packing_order(np.arange(n), fraction)
+      turned = np.zeros(n, dtype=bool)
+      flip_splits = False
+      best = pack_variant(self.id, self.z_base, presents, engine, fraction, rotation, order, turned, flip_splits)
+      # the same changes in the same order for a layer, as many as the time allows
+      rng = random.Random(self.id)
+      tries = 0
+      while moves and time.time() < deadline:
+         new_order, new_turned, new_flip_splits = order, turned, flip_splits
+         move = rng.choice(moves)
+         if move == 'swap':
+            i, j = rng.sample(xrange(sorties), 2)
+            new_order = order.copy()
+            new_order[i], new_order[j] = order[j], order[i]
+         elif move == 'turn':
+            new_turned = turned.copy()
+            new_turned[rng.randrange(n)] ^= True
          else:
-            [x1, x2, y1, y2, z1, z2] = coordinates
-            present.xpos = min(x1,x2)
-            present.ypos = min(y1,y2)
-            present.zpos = min(z1,z2)
-            self.presents.append(present)
-            self.z_max = max(self.z_max, present.zpos + present.z_depth - 1)
-#      print [p.id for p in leftovers]
-      self.presents.sort(key= lambda p : p.id)
-      leftovers.sort(key= lambda p : p.id)
-      return leftovers
+            new_flip_splits = not flip_splits
+         result = pack_variant(self.id, self.z_base, presents, engine, fraction, rotation,
+                               new_order, new_turned, new_flip_splits)
+         tries += 1
+         score, best_score = (len(result[2]), result[3]), (len(best[2]), best[3])
+         if score <= best_score:
+            if score < best_score:
+               stats.count('anytime_improvements')
+            order, turned, flip_splits, best = new_order, new_turned, new_flip_splits, result
+      stats.count('anytime_tries', tries)
+      return self.apply_candidate(rows, best)
+
+   """ MaxRects packing, best short side fit """
+   def max_rect_pack(self, fraction=SORT_FRACTION, order=None):
+      self.free_rectangles = FreeRectangles()
+      self.free_rectangles.add(Rectangle()) #entire shelf
+      self.used_rectangles = []
+      return self.pack_presents(self.pack_present, fraction, order)
 
 
-   def pack_present(self, present):
+   """ Place a width x height present (row of the table), return [xpos, ypos, width, height] or None """
+   def pack_present(self, row, width, height):
       #find the new rectangle where to store the present
-      newRect = self.find_position()
-      if newRect = None:
+      newRect = self.find_position(width, height)
+      if newRect is None:
          return None
      
-      #detect which rectangles are affected by splitting the new rectangle
-      toDelete= []
-      for i,r in enumerate(self.free_rectangles):
-         if self.split_rect(r, newRect):
-            toDelete.append(i)
-      for i in toDelete:
-         del self.free_rectangles[i]
+      #split the free rectangles overlapping the new rectangle
+      newRects = []
+      for r in self.free_rectangles.overlapping(newRect):
+         self.free_rectangles.remove(r)
+         self.split_rect(r, newRect, newRects)
       
-      # prune the list 
-      self.prune_free()
+      # add the new free rectangles that are not contained in another one
+      stats.count('free_rects_created', len(newRects))
+      self.prune_free(newRects)
 
-      used_rectangles.append(newRect)
-      
-      return newRect
-
-
-   def find_position(self, present):
-      bestRect = Rectangle()
-      bestShortSideFit = SLEIGH_LENGTH 
-      bestLongSideFit = SLEIGH_LENGTH 
-      for i,r in enumerate(self.free_rectangles):
-
-         ####################
-         if r.width >= present.width and r.height >= present.height:
-            leftoverHoriz = r.width - present.width
-            leftoverVert = r.height - present.height
-            shortSideFit = min(leftoverHoriz, leftoverVert)
-            longSideFit = max(leftoverHoriz, leftoverVert)
-
-            if shortSideFit < bestShortSideFit or (shortSideFit == bestShortSideFit and longSideFit < bestLongSideFit):
-               bestRect.xpos = r.xpos
-               bestRect.ypos = r.ypos
-               bestRect.width = present.width
-               bestRect.height = present.height
-               bestShortSideFit = shortSideFit
-               bestLongSideFit = longSideFit
-
-         ####################
-         if r.width >= present.height and r.height >= present.height:
-            present.rotate()
-            leftoverHoriz = r.width - present.width
-            leftoverVert = r.height - present.height
-            shortSideFit = min(leftoverHoriz, leftoverVert)
-            longSideFit = max(leftoverHoriz, leftoverVert)
-
-            if shortSideFit < bestShortSideFit or (shortSideFit == bestShortSideFit and longSideFit < bestLongSideFit):
-               bestRect.xpos = r.xpos
-               bestRect.ypos = r.ypos
-               bestRect.width = present.width
-               bestRect.height = present.height
-               bestShortSideFit = shortSideFit
-               bestLongSideFit = longSideFit
-            else:
-               present.rotate()
-      
-      if bestShortSideFit == SLEIGH_LENGTH:
+      self.used_rectangles.append(newRect)
+
+      return [newRect.xpos, newRect.ypos, newRect.width, newRect.height]
+
+
+   """ Best short side fit over both orientations: the rectangle of the present, rotated if needed """
+   def find_position(self, width, height):
+      best = self.free_rectangles.find_best(width, height)
+      if width != height and self.rotation != 'fixed':
+         stats.count('rotations')
+         rotated = self.free_rectangles.find_best(height, width)
+         if rotated is not None and (best is None or rotated[:3] < best[:3]):
+            width, height = height, width
+            best = rotated
+      if best is None:
          return None
-      return bestRect
+      r = best[3]
+      return Rectangle(r.xpos, r.ypos, width, height)
 
-   def split_rect(self, freeRect, usedRect):
-      #TODO: check bounds!!!
+   """ Append to newRects the (maximal) parts of freeRect not covered by usedRect """
+   def split_rect(self, freeRect, usedRect, newRects):
       if not freeRect.overlap(usedRect):
          return False
- 
-      if (usedRect.xpos <= freeRect.xpos + freeRect.width-1 and usedRect.xpos + usedRect.width-1 >= freeRect.xpos):
-        
-              # New node at the top side of the used node.
-              if (usedRect.ypos > freeRect.ypos and usedRect.ypos < freeRect.ypos + freeRect.height-1):
-                 #horrible
-                 newRect = Rectangle()
-                 newRect.xpos = freeRect.xpos
-                 newRect.ypos = freeRect.ypos
-                 newRect.width = freeRect.width
-                 newRect.height = freeRect.height
-                 
-                 newRect.height = usedRect.ypos - newRect.ypos
-                 self.free_rectangles.append(newRect)
-
-              # New node at the bottom side of the used node.
-              if (usedRect.ypos + usedRect.height < freeRect.ypos + freeRect.height):
-                 #horrible
-                 newRect = Rectangle()
-                 newRect.xpos = freeRect.xpos
-                 newRect.ypos = freeRect.ypos
-                 newRect.width = freeRect.width
-                 newRect.height = freeRect.height
-             
-                 newRect.ypos = usedRect.ypos + usedRect.height
-                 newRect.height = freeRect.ypos + freeRect.height - (usedRect.ypos + usedRect.height)
-                 self.free_rectangles.append(newRect)
-
-        if (usedRect.ypos < freeRect.ypos + freeRect.height and usedRect.ypos + usedRect.height > freeRect.ypos):
-        
-              # New node at the left side of the used node.
-              if (usedRect.xpos > freeRect.xpos and usedRect.xpos < freeRect.xpos + freeRect.width):
-                 #horrible
-                 newRect = Rectangle()
-                 newRect.xpos = freeRect.xpos
-                 newRect.ypos = freeRect.ypos
-                 newRect.width = freeRect.width
-                 newRect.height = freeRect.height
-             
-                 newRect.width = usedRect.xpos - newRect.xpos
-                 self.free_rectangles.append(newRect)
-
-              # New node at the right side of the used node.
-              if (usedRect.xpos + usedRect.width < freeRect.xpos + freeRect.width):
-                 #horrible
-                 newRect = Rectangle()
-                 newRect.xpos = freeRect.xpos
-                 newRect.ypos = freeRect.ypos
-                 newRect.width = freeRect.width
-                 newRect.height = freeRect.height
-            
-                 newRect.xpos = usedRect.xpos + usedRect.width
-                 newRect.width = freeRect.xpos + freeRect.width - (usedRect.xpos + usedRect.width)
-                 self.free_rectangles.append(newRect)
-
-        return True
-
-
-   def prune_free(self):
-      toDelete = set()
-      for i,r in enumerate(self.free_rectangles):
-         for j,r2 in enumerate(self.free_rectangles):
-            if j>i:
-               if r2.contains(r):
-                  toDelete.add(r)
-                  break
-               if r.contains(r2):
-                  toDelete.add(r2)
-      for i in toDelete:
-         del self.free_rectangles[i]
 
-      return
+      fx2 = freeRect.xpos + freeRect.width   # first x after the rectangle
+      fy2 = freeRect.ypos + freeRect.height
+      ux2 = usedRect.xpos + usedRect.width
+      uy2 = usedRect.ypos + usedRect.height
+
+      if usedRect.xpos < fx2 and ux2 > freeRect.xpos:
+         # New node at the bottom side of the used node.
+         if usedRect.ypos > freeRect.ypos and usedRect.ypos < fy2:
+            newRects.append(Rectangle(freeRect.xpos, freeRect.ypos, freeRect.width, usedRect.ypos - freeRect.ypos))
+         # New node at the top side of the used node.
+         if uy2 < fy2:
+            newRects.append(Rectangle(freeRect.xpos, uy2, freeRect.width, fy2 - uy2))
+
+      if usedRect.ypos < fy2 and uy2 > freeRect.ypos:
+         # New node at the left side of the used node.
+         if usedRect.xpos > freeRect.xpos and usedRect.xpos < fx2:
+            newRects.append(Rectangle(freeRect.xpos, freeRect.ypos, usedRect.xpos - freeRect.xpos, freeRect.height))
+         # New node at the right side of the used node.
+         if ux2 < fx2:
+            newRects.append(Rectangle(ux2, freeRect.ypos, fx2 - ux2, freeRect.height))
 
+      return True
 
-   """ Guillotine packing """
-   def guillotine_pack(self):
-#      print len(self.presents)
-      sorties = int(0.7*len(self.presents))
-      tmp = self.presents[:sorties]
-      tmp.sort(key= lambda p : p.area, reverse=True)
-      tmp.extend(self.presents[sorties:])
-      self.presents = []
-      leftovers = []
-      full = False
-      for present in tmp:
-         if full == True:
-            leftovers.append(present)
-            continue
-         
-         coordinates = self.guillotine_pack_present(present) 
-         
-         if coordinates is None:
-            full = True
-#            print "First leftover", present.id
-            leftovers.append(present)
+
+   """ Add the new free rectangles to the free list, except those contained in another one.
+   The old free rectangles need not be checked against each other, nor against the new ones:
+   a new rectangle is part of an old one that was maximal, so it cannot contain another old one. """
+   def prune_free(self, newRects):
+      kept = []
+      for r in newRects:
+         if self.free_rectangles.is_contained(r):
+            stats.count('free_rects_pruned')
             continue
-         else:
-            [x1, x2, y1, y2, z1, z2] = coordinates
-            present.xpos = min(x1,x2)
-            present.ypos = min(y1,y2)
-            present.zpos = min(z1,z2)
-            self.presents.append(present)
-            self.z_max = max(self.z_max, present.zpos + present.z_depth - 1)
-#      print [p.id for p in leftovers]
-      self.presents.sort(key= lambda p : p.id)
-      leftovers.sort(key= lambda p : p.id)
-      return leftovers
+         # new rectangles are few, check them against each other directly
+         for r2 in [r2 for r2 in kept if r.contains(r2)]:
+            stats.count('free_rects_pruned')
+            kept.remove(r2)
+            self.free_rectangles.remove(r2)
+         kept.append(r)
+         self.free_rectangles.add(r)
+
+      return
+
 
-   """ Try to pack a present in this layer """ #TODO better packing!
-   def guillotine_pack_present(self, present):
-      leaf = self.tree.root.insert(present)
+   """ Guillotine packing """
+   def guillotine_pack(self, fraction=SORT_FRACTION, order=None):
+      self.tree = TREE
+      self.tree.reset(self.flip_splits)
+      return self.pack_presents(self.guillotine_pack_present, fraction, order)
+
+   """ Try to pack a present (row of the table) in this layer, return [xpos, ypos, width, height] or None """ #TODO better packing!
+   def guillotine_pack_present(self, row, width, height):
+      leaf = self.tree.insert(width, height, row)
       #print tree
-      if leaf is None:
-         present.rotate()
-         leaf = self.tree.root.insert(present)
+      if leaf is None and self.rotation != 'fixed':
+         stats.count('rotations')
+         width, height = height, width
+         leaf = self.tree.insert(width, height, row)
 
       if leaf is None:
-         # Really no space! Rotate it back
-         present.rotate()
+         # Really no space!
          return None
          #open a new layer!
          #layer.z_base = layer.z_max + 1
-         #tree.root = Node()
-         #leaf = tree.root.insert(present)
-
-      x1 = leaf.xpos
-      x2 = leaf.xpos - leaf.width + 1
-      y1 = leaf.ypos
-      y2 = leaf.ypos - leaf.height + 1 
-      z1 = layer.z_base 
-      z2 = z1 + present.z_depth - 1
+         #tree.reset()
+         #leaf = tree.insert(width, height, row)
 
-      return [x1, x2, y1, y2, z1, z2]
+      return [self.tree.xpos[leaf] - width + 1, self.tree.ypos[leaf] - height + 1, width, height]
 
    
    
-   """ Copy presents and sort them decreasingly by tallest z-point they reach (if no compactor, the z_pos term is all the same (z_base), but otherwise it's not). """
-   def sort_presents(self):
-      self.sorted_presents = list(self.presents)
-      self.sorted_presents.sort(key= lambda p : (p.zpos+p.z_depth-1), reverse=True)
-      return self.sorted_presents
+   """ Skyline packing, bottom-left: each present goes at the lowest y, then the lowest x """
+   def skyline_pack(self, fraction=SORT_FRACTION, order=None):
+      self.skyline = Skyline()
+      return self.pack_presents(self.skyline_pack_present, fraction, order)
+
+   def skyline_pack_present(self, row, width, height):
+      best = self.skyline.find_position(width, height)
+      if width != height and self.rotation != 'fixed':
+         stats.count('rotations')
+         rotated = self.skyline.find_position(height, width)
+         if rotated is not None and (best is None or rotated < best):
+            width, height = height, width
+            best = rotated
+      if best is None:
+         return None
+      y, x = best
+      self.skyline.place(x, width, y + height)
+      return [x, y + 1, width, height]
+
+   """ Height map of the shelf: for each (x, y) of the sleigh floor, the top z of the present above it (0 if none). """
+   def top_map(self):
+      if self.tops is None:
+         self.tops = self.table.top_map(self.rows, SLEIGH_LENGTH)
+      return self.tops
      
-   """ Compactor """
+   """ Compactor: move the presents down onto the previous shelf, in order of id,
+   never below a present before them """
    def compact(self, prev_layer):
-      #prev_layer.z_base # do not exceed
-      #print "Layer", self.id
-      z_min = prev_layer.z_base-1 #z_min up to current present. then, following presents must not be smaller, they can be equal or greater.
-
+      self.table.compact(self.rows, prev_layer.top_map(), prev_layer.z_base-1)
       # recompute z_max
-      self.z_max = self.z_base
-      
-      for p in self.presents: #in order of id!
-         # presents in the previous layer sorted by decreasing z-height
-         for up_p in prev_layer.sort_presents():
-            if p.overlap(up_p):
-               # this is the tallest overlapping present: you can move down the present, if possible. 
-               # if not possible, break!
-               diff = p.zpos - (up_p.zpos+up_p.z_depth)
-               if diff > 0 and (p.zpos - diff) >= z_min:
-#                  print "good overlap", p.id, diff
-#                  print "previous pos", p.zpos
-                  p.zpos -= diff
-#                  print "new pos", p.zpos
-                  z_min = max(p.zpos, z_min)
-               break
-         z_min = max(p.zpos, z_min)
-         #print "zmin", z_min
-         self.z_max = max(self.z_max, p.zpos + p.z_depth - 1)
-      
+      self.z_max = max([self.z_base] + self.table.tops(self.rows).tolist())
       return
 
 
@@ -326,52 +361,249 @@ class Layer:
    def finalize_shelf(self):
       #fracs = offset.astype(float)/offset.max()
       #norm = colors.normalize(fracs.min(), fracs.max())
-      for i,p in enumerate(self.presents):
-         if self.id <= MAX_LAYERS:
-            x1, x2, y1, y2, z1, z2 = p.xpos, p.xpos+p.width-1, p.ypos, p.ypos + p.height-1, p.zpos, p.zpos + p.z_depth-1
-            xpos.append(min(x1,x2))
-            ypos.append(min(y1,y2))
-            zpos.append(min(z1,z2))
-            dx.append(abs(x1-x2))
-            dy.append(abs(y1-y2))
-            dz.append(abs(z1-z2))
-            colors.append(cm.jet(float(i)/len(self.presents)))
+      if self.id <= MAX_LAYERS:
+         bounds = zip(*[a.tolist() for a in self.table.bounds(self.rows)])
+         for i, (x1, x2, y1, y2, z1, z2) in enumerate(bounds):
+            xpos.append(x1)
+            ypos.append(y1)
+            zpos.append(z1)
+            dx.append(x2-x1)
+            dy.append(y2-y1)
+            dz.append(z2-z1)
+            colors.append(cm.jet(float(i)/len(self.rows)))
 
    """ Reflect x and y axis """ 
    def reflect_shelf(self):
       #print "Flipping layer", self.id
-      for p in self.presents:
-         p.xpos = 1 + SLEIGH_LENGTH - (p.xpos + p.width - 1)
-         p.ypos = 1 + SLEIGH_LENGTH - (p.ypos + p.height - 1)
-         
+      self.table.reflect(self.rows, SLEIGH_LENGTH)
+
 
+   """ Record the placements of the shelf, to be written once maxz is known """
+   def record_shelf(self):
+      self.table.record(self.rows)
 
-   """ Write next line """
+   """ Presents, fill ratio, leftovers and height of the shelf, for the stats """
+   def record_stats(self, leftovers):
+      if stats.enabled:
+         stats.count('leftovers', len(leftovers))
+         stats.record_layer(self.id, presents=len(self.rows),
+                            fill=int(self.table.area[self.rows].sum()) / float(SLEIGH_LENGTH*SLEIGH_LENGTH),
+                            leftovers=len(leftovers), z_base=self.z_base, z_max=self.z_max)
+
+   """ Write the shelf with a SubmissionWriter """
    def write_shelf(self, writer, maxz):
-      for p in self.presents:
-         x1, x2, y1, y2, z1, z2 = p.xpos, p.xpos+p.width-1, p.ypos, p.ypos + p.height-1, p.zpos, p.zpos + p.z_depth-1
-         z1 = maxz - z1 + 1
-         z2 = maxz - z2 + 1
-
-         list_vertices = [x1, y1, z1]
-         list_vertices += [x1, y2, z1]
-         list_vertices += [x2, y1, z1]
-         list_vertices += [x2, y2, z1]
-         list_vertices += [x1, y1, z2]
-         list_vertices += [x1, y2, z2]
-         list_vertices += [x2, y1, z2]
-         list_vertices += [x2, y2, z2]
-         writer.writerow([p.id] + list_vertices)
+      self.table.write(writer, maxz, self.rows)
       return 
 
+""" Pack a copy of the presents of a layer with one (engine, fraction, rotation) of the portfolio.
+presents is a PresentTable of the presents of the layer, packed in place.
+Returns the table, the rows packed, the rows left over and the top of the packed presents. """
+def pack_candidate(args):
+   id, z_base, presents, engine, fraction, rotation = args
+   return pack_variant(id, z_base, presents, engine, fraction, rotation)
+
+""" pack_candidate with the given packing order of the rows of presents, the presents of turned turned
+first and, for the guillotine engine, the free space cut along the other side if flip_splits (see Layer.anytime_pack) """
+def pack_variant(id, z_base, presents, engine, fraction, rotation, order=None, turned=None, flip_splits=False):
+   presents = presents.copy()
+   if turned is not None:
+      presents.rotate(np.flatnonzero(turned))
+   layer = Layer(id, z_base, presents, range(len(presents)))
+   layer.flip_splits = flip_splits
+   leftovers = layer.pack(engine, fraction, rotation, order=order)
+   top = max([z_base] + presents.tops(layer.rows).tolist())
+   return presents, layer.rows, leftovers, top
+
 class Tree:
+   """ Guillotine tree of a layer, in preallocated columns indexed by node: node 0 is the root,
+   the children of a node are child[node] and child[node]+1 (child[node] is 0 for a leaf).
+   max_width and max_height are the largest free width and height in the subtree of a node
+   (0 if it is full): a subtree can only take a present if both are large enough.
+   reset() empties the tree for the next layer, keeping the storage. """
+   CAPACITY = 4096
+   COLUMNS = ['xpos', 'ypos', 'width', 'height', 'max_width', 'max_height', 'child', 'parent', 'id']
+
    def __init__(self):
-      self.root = Node()
+      for name in self.COLUMNS:
+         setattr(self, name, array('i'))
+      self.size = 0
+      self.grow(self.CAPACITY)
+      self.reset()
+
+   def grow(self, size):
+      """ Room for size nodes """
+      for name in self.COLUMNS:
+         getattr(self, name).extend([0] * (size - self.size))
+      self.size = size
+
+   def reset(self, flip_splits=False):
+      """ Only the root, free: the whole sleigh floor. With flip_splits, free space is cut along the other side (see split). """
+      self.flip_splits = flip_splits
+      self.count = 1
+      self.xpos[0] = SLEIGH_LENGTH
+      self.ypos[0] = SLEIGH_LENGTH
+      self.width[0] = SLEIGH_LENGTH
+      self.height[0] = SLEIGH_LENGTH
+      self.max_width[0] = SLEIGH_LENGTH
+      self.max_height[0] = SLEIGH_LENGTH
+      self.child[0] = 0
+      self.parent[0] = -1
+      self.id[0] = -1
+
+   def insert(self, width, height, id):
+      """ Put a width x height present in the first free leaf large enough, return that leaf or None """
+      # DFS leftmost child first, skipping the subtrees that cannot fit the present
+      max_width, max_height, child = self.max_width, self.max_height, self.child
+      stack = [0]
+      visits = 0
+      while stack:
+         node = stack.pop()
+         visits += 1
+         if max_width[node] < width or max_height[node] < height:
+            continue
+         # if not leaf, visit children
+         first = child[node]
+         if first:
+            stack.append(first + 1)
+            stack.append(first)
+            continue
+         # free leaf large enough
+         leaf = self.split(node, width, height)
+         self.id[leaf] = id
+         self.update_free_space(leaf)
+         stats.count('insert_visits', visits)
+         return leaf
+      stats.count('insert_visits', visits)
+      return None
+
+   def split(self, node, width, height):
+      """ Split a free leaf until the first child is width x height, return that child.
+      The leaf is cut across its longer leftover side first, or its shorter one with flip_splits. """
+      # if the space is larger, split the space
+      while self.width[node] != width or self.height[node] != height:
+         if self.count + 2 > self.size:
+            self.grow(2*self.size)
+         xpos, ypos, widths, heights = self.xpos, self.ypos, self.width, self.height
+         first = self.count
+         second = first + 1
+         self.count += 2
+         self.child[node] = first
+         self.child[first] = self.child[second] = 0
+         self.parent[first] = self.parent[second] = node
+
+         dw = widths[node] - width
+         dh = heights[node] - height
+
+         if self.flip_splits:
+            vertical = dh == 0 or 0 < dw <= dh
+         else:
+            vertical = dw > dh
+         # cut vertically 
+         if vertical:
+            xpos[first] = xpos[node]
+            ypos[first] = ypos[node]
+            widths[first] = width
+            heights[first] = heights[node]
+            
+            xpos[second] = xpos[node] - width
+            ypos[second] = ypos[node]
+            widths[second] = widths[node] - width
+            heights[second] = heights[node]
+         # cut horizontally
+         else:
+            xpos[first] = xpos[node]
+            ypos[first] = ypos[node]
+            widths[first] = widths[node]
+            heights[first] = height
+            
+            xpos[second] = xpos[node]
+            ypos[second] = ypos[node] - height
+            widths[second] = widths[node]
+            heights[second] = heights[node] - height
+
+         for n in (first, second):
+            self.max_width[n] = widths[n]
+            self.max_height[n] = heights[n]
+
+         # insert in first child
+         node = first
+      return node
+
+   def update_free_space(self, leaf):
+      """ Mark an occupied leaf and update the largest free width and height up to the root """
+      max_width, max_height, child, parent = self.max_width, self.max_height, self.child, self.parent
+      max_width[leaf] = 0
+      max_height[leaf] = 0
+      node = parent[leaf]
+      while node >= 0:
+         first = child[node]
+         w = max(max_width[first], max_width[first + 1])
+         h = max(max_height[first], max_height[first + 1])
+         if w == max_width[node] and h == max_height[node]:
+            break
+         max_width[node] = w
+         max_height[node] = h
+         node = parent[node]
+
+TREE = Tree() # reset and reused by each layer
+
+class Skyline:
+   """ Skyline of a layer: for each x in 1..SLEIGH_LENGTH, the largest y occupied so far,
+   kept as its segments: the sorted left ends of the runs of equal height, with their heights.
+   A present placed bottom-left can always slide left onto the left end of a segment, so only
+   those are tried; the height under the present is the max of the segments it spans, found
+   with a bisect and a max over a slice of the heights. The search is linear in the number of
+   segments, not logarithmic: the lowest position is a min over all positions of a max, which
+   a segment tree of the heights does not answer in one descent, and the segments of a layer
+   are a few tens, each tried at the cost of two C calls instead of a tree query in Python. """
+   def __init__(self):
+      self.starts = [1] # left ends of the skyline segments
+      self.levels = [0] # heights of the skyline segments
+
+   def height(self, x):
+      return self.levels[bisect.bisect_right(self.starts, x) - 1]
+
+   def find_position(self, width, height):
+      """ Lowest (y, x) where a width x height rectangle fits above the skyline, or None """
+      starts, levels = self.starts, self.levels
+      best = None
+      for i, x in enumerate(starts):
+         x2 = x + width - 1
+         if x2 > SLEIGH_LENGTH:
+            break
+         # the rectangle cannot be lower than the segment it starts on
+         level = levels[i]
+         if level + height > SLEIGH_LENGTH or (best is not None and level >= best[0]):
+            continue
+         y = max(levels[i:bisect.bisect_right(starts, x2, i)])
+         if y + height <= SLEIGH_LENGTH and (best is None or y < best[0]):
+            best = (y, x)
+            if y == 0:
+               break
+      return best
+
+   def place(self, x, width, y):
+      """ Raise the skyline over x..x+width-1 to y """
+      x2 = x + width - 1
+      starts = self.starts
+      first = bisect.bisect_left(starts, x)
+      last = bisect.bisect_right(starts, x2 + 1)
+      new, levels = [], []
+      if x == 1 or self.height(x - 1) != y:
+         new.append(x)
+         levels.append(y)
+      if x2 < SLEIGH_LENGTH:
+         level = self.height(x2 + 1)
+         if level != y:
+            new.append(x2 + 1)
+            levels.append(level)
+      starts[first:last] = new
+      self.levels[first:last] = levels
 
 class Rectangle:
-   def __init__(self, w=SLEIGH_LENGTH, h=SLEIGH_LENGTH):
-      self.xpos = 1 
-      selx.ypos = 1
+   def __init__(self, xpos=1, ypos=1, w=SLEIGH_LENGTH, h=SLEIGH_LENGTH):
+      self.xpos = xpos 
+      self.ypos = ypos
       self.width = w 
       self.height = h 
  
@@ -388,168 +620,363 @@ class Rectangle:
          return False
       return True
 
-class Present:
-   def __init__(self, row):
-      self.id = int(row[0])
-      dim = [int(x) for x in row[1:]]
-      dim.sort()
-      self.width = dim[0]     # along x-axis 
-      self.height = dim[1]    # along y-axis
-      self.z_depth = dim[2]   # along z-axis
-      self.area = self.width * self.height
-      self.xpos = 0
-      self.ypos = 0
-      self.zpos = 0
-  
-   # rotate on the x-y plane
-   def rotate(self):
-      self.width, self.height = self.height, self.width
-      # should also change positions? it's not univocal.
-
-   def overlap(self, present):
-      # make sure that positions are good, not 0's!
+   def contains(self, rectangle):
+      return self.xpos <= rectangle.xpos and self.ypos <= rectangle.ypos and \
+         rectangle.xpos + rectangle.width <= self.xpos + self.width and \
+         rectangle.ypos + rectangle.height <= self.ypos + self.height
 
-      if (self.xpos+self.width-1) < present.xpos:
-         return False
-      if self.xpos > (present.xpos+present.width-1):
-         return False
-      if (self.ypos+self.height-1) < present.ypos:
-         return False
-      if self.ypos > (present.ypos+present.height-1): 
-         return False
-      return True
-      
+class FreeRectangles:
+   """ Free rectangles of MaxRects, bucketed by width and height, so that the
+   best fit of a present is looked for only in the buckets of rectangles large
+   enough, from the tightest ones on. They are also registered in a uniform grid
+   over the sleigh floor, to find the ones overlapping or containing a rectangle. """
+   BUCKET = 25
+   CELL_SIZE = 50
 
-class Node:
    def __init__(self):
-      self.child = [None, None]
-      self.xpos = SLEIGH_LENGTH 
-      self.ypos = SLEIGH_LENGTH 
-      self.width = SLEIGH_LENGTH 
-      self.height = SLEIGH_LENGTH 
-      self.id = None
-
-   def insert(self, present):
-      # if not leaf, DFS leftmost child
-      if self.child[0] is not None and self.child[1] is not None:
-         newNode = self.child[0].insert(present)
-         if newNode is not None:
-            return newNode
-         return self.child[1].insert(present)
-      
-      # if it's a leaf
+      self.buckets = {} # (width/BUCKET, height/BUCKET) -> set of rectangles
+      self.cells = {} # (x/CELL_SIZE, y/CELL_SIZE) -> set of rectangles
+      self.count = 0
+
+   def cells_of(self, rect):
+      size = self.CELL_SIZE
+      return [(i, j)
+              for i in xrange((rect.xpos - 1) // size, (rect.xpos + rect.width - 2) // size + 1)
+              for j in xrange((rect.ypos - 1) // size, (rect.ypos + rect.height - 2) // size + 1)]
+
+   def __len__(self):
+      return self.count
+
+   def __iter__(self):
+      for bucket in self.buckets.values():
+         for r in bucket:
+            yield r
+
+   def add(self, rect):
+      key = (rect.width // self.BUCKET, rect.height // self.BUCKET)
+      self.buckets.setdefault(key, set()).add(rect)
+      for cell in self.cells_of(rect):
+         self.cells.setdefault(cell, set()).add(rect)
+      self.count += 1
+
+   def remove(self, rect):
+      key = (rect.width // self.BUCKET, rect.height // self.BUCKET)
+      bucket = self.buckets[key]
+      bucket.remove(rect)
+      if not bucket:
+         del self.buckets[key]
+      for cell in self.cells_of(rect):
+         self.cells[cell].discard(rect)
+      self.count -= 1
+
+   def overlapping(self, rect):
+      found = set()
+      for cell in self.cells_of(rect):
+         found.update(self.cells.get(cell, ()))
+      return [r for r in found if r.overlap(rect)]
+
+   def is_contained(self, rect):
+      """ True if a free rectangle contains rect: it has to cover its first corner """
+      size = self.CELL_SIZE
+      for r in self.cells.get(((rect.xpos - 1) // size, (rect.ypos - 1) // size), ()):
+         if r.contains(rect):
+            return True
+      return False
+
+   def find_best(self, width, height):
+      """ Best short side fit of a width x height present: returns
+      (short side fit, long side fit, (ypos, xpos), rectangle) or None """
+      size = self.BUCKET
+      candidates = []
+      for key in self.buckets:
+         if key[0] >= width // size and key[1] >= height // size:
+            # lower bound of the short side fit in this bucket
+            bound = min(max(0, key[0]*size - width), max(0, key[1]*size - height))
+            candidates.append((bound, key))
+      candidates.sort()
+
+      best = None
+      for bound, key in candidates:
+         if best is not None and bound > best[0]:
+            break
+         for r in self.buckets[key]:
+            if r.width >= width and r.height >= height:
+               leftoverHoriz = r.width - width
+               leftoverVert = r.height - height
+               fit = (min(leftoverHoriz, leftoverVert), max(leftoverHoriz, leftoverVert), (r.ypos, r.xpos))
+               if best is None or fit < best[:3]:
+                  best = fit + (r,)
+      return best
+
+
+class TimeBudget:
+   """ Time of the anytime packing of the layers (see Layer.anytime_pack): seconds per layer, or a run
+   deadline, each layer getting the share of the time left of the area of its presents in the area left
+   to pack. The greedy packing of a layer counts in its time. """
+   def __init__(self, layer_seconds=None, run_seconds=None, area=0):
+      self.layer_seconds = layer_seconds
+      self.deadline = None
+      if run_seconds is not None:
+         self.deadline = time.time() + run_seconds
+      self.area = area # area of the presents left to pack
+
+   """ Deadline of a layer of presents of the given area """
+   def layer_deadline(self, area):
+      now = time.time()
+      if self.deadline is None:
+         return now + self.layer_seconds
+      return now + max(0.0, self.deadline - now) * area / max(self.area, area, 1)
+
+   """ The presents of area were packed """
+   def packed(self, area):
+      self.area -= area
+
+
+""" Pack a full layer, reflect it if even, compact it against the previous one and record it.
+Returns the rows of the presents that did not fit. """
+def finish_layer(layer, prev_layer, pool=None):
+   with stats.timer('pack'):
+      if BUDGET is None:
+         leftovers = layer.pack(pool=pool)
       else:
-         # if the space is occupied
-         if self.id is not None:
-            return None
-        
-         # if the space is too small
-#         if self.width < present.width or self.height < present.height:
-#            present.rotate()
-         if self.width < present.width or self.height < present.height:
-#            present.rotate() #rotate it back
-            return None
-
-         # if the space is perfect
-         if self.width == present.width and self.height == present.height:
-            self.id = present.id
-            return self
-
-         # if the space is larger,
-         # split the space 
-         self.child[0] = Node()
-         self.child[1] = Node()
-
-         dw = self.width - present.width
-         dh = self.height - present.height
+         area = int(layer.table.area[layer.rows].sum())
+         leftovers = layer.anytime_pack(BUDGET.layer_deadline(area))
+         BUDGET.packed(area - int(layer.table.area[leftovers].sum()))
+   finish_packed_layer(layer, prev_layer, leftovers)
+   return leftovers
+
+""" Reflect a packed layer if even, compact it against the previous one and record it. """
+def finish_packed_layer(layer, prev_layer, leftovers):
+   if layer.id % 2 == 0:
+      with stats.timer('reflect_shelf'):
+         layer.reflect_shelf()
+
+   # compact shelf down (if possible), preserving order
+   if prev_layer is not None:
+      with stats.timer('compact'):
+         layer.compact(prev_layer)
+
+   # store coordinates for plotting
+   if PLOT:
+      layer.finalize_shelf()
+
+   with stats.timer('record_shelf'):
+      layer.record_shelf()
+   layer.record_stats(leftovers)
+
+
+""" Pack a layer with PACKING_ENGINE in the packer process of a LayerPipeline.
+Returns the result of pack_candidate and the counters of the stats of the packing. """
+def pack_layer(args):
+   stats.counters = {}
+   return pack_candidate(args), stats.counters
+
+class LayerPipeline:
+   """ Packing in a separate process, overlapped with the main one: while the packer process packs
+   a layer, the main process reflects, compacts and records the previous one. Nothing else runs
+   meanwhile: the presents of the next layer are only added once the leftovers of this one are
+   known, and they were all read before packing started. A layer is sent at a provisional z_base,
+   the top of the previous layer before compaction, and moved onto the previous layer once that
+   one is compacted. """
+   def __init__(self, prev_layer=None):
+      self.pool = multiprocessing.Pool(1)
+      self.pending = None # packed layer and its leftovers, not finished yet
+      self.prev_layer = prev_layer # last finished layer
+
+   """ Pack the layer in the packer process and finish the pending layer meanwhile.
+   Returns the rows of the presents that did not fit. """
+   def pack(self, layer):
+      rows = np.asarray(layer.rows, dtype=np.intp)
+      task = (layer.id, layer.z_base, layer.table.take(rows), PACKING_ENGINE, SORT_FRACTION, 'free')
+      result = self.pool.apply_async(pack_layer, [task])
+      self.finish()
+      if self.prev_layer is not None:
+         layer.rebase(self.prev_layer.z_max+1)
+      with stats.timer('pack'):
+         packing, counters = result.get()
+      for name, n in counters.items():
+         stats.count(name, n)
+      leftovers = layer.apply_candidate(rows, packing)
+      if PACKING_ENGINE == 'portfolio' and len(rows):
+         # as in portfolio_pack
+         layer.z_max = max(layer.z_max, layer.z_base + int(layer.table.z_depth[rows].max()) - 1)
+      self.pending = (layer, leftovers)
+      return leftovers
 
-         # cut vertically 
-         if dw > dh:
-            self.child[0].xpos = self.xpos
-            self.child[0].ypos = self.ypos
-            self.child[0].width = present.width
-            self.child[0].height = self.height
-            
-            self.child[1].xpos = self.xpos - present.width
-            self.child[1].ypos = self.ypos
-            self.child[1].width = self.width - present.width
-            self.child[1].height = self.height
-         # cut horizontally
+   """ Reflect, compact and record the pending layer """
+   def finish(self):
+      if self.pending is not None:
+         layer, leftovers = self.pending
+         finish_packed_layer(layer, self.prev_layer, leftovers)
+         self.prev_layer = layer
+         self.pending = None
+
+   def close(self):
+      self.finish()
+      self.pool.close()
+      self.pool.join()
+
+
+""" Save the packing state after rows presents were read: the open layer, the previous one,
+the area added to the open layer and the columns of the table changed so far (with the rows recorded).
+The file is replaced atomically, so that a crash leaves the previous checkpoint. """
+def save_checkpoint(filename, table, layer, prev_layer, cumul_area, rows):
+   tmpFilename = filename + '.tmp'
+   with open(tmpFilename, 'wb') as f:
+      np.savez(f,
+               state=np.array([rows, cumul_area, layer.id, layer.z_base, layer.z_max,
+                               prev_layer.id, prev_layer.z_base, prev_layer.z_max], dtype=np.int64),
+               layer=np.asarray(layer.rows, dtype=np.int32),
+               prev_layer=np.asarray(prev_layer.rows, dtype=np.int32),
+               **table.state())
+   os.rename(tmpFilename, filename)
+
+""" Load a checkpoint written by save_checkpoint into the table.
+Returns the open layer, the previous one, the area added to the open layer and the number of presents read. """
+def load_checkpoint(filename, table):
+   checkpoint = np.load(filename)
+   [rows, cumul_area, id, z_base, z_max, prev_id, prev_z_base, prev_z_max] = checkpoint['state'].tolist()
+   table.set_state(checkpoint)
+   layer = Layer(id, z_base, table, checkpoint['layer'].tolist())
+   layer.z_max = z_max
+   prev_layer = Layer(prev_id, prev_z_base, table, checkpoint['prev_layer'].tolist())
+   prev_layer.z_max = prev_z_max
+   return layer, prev_layer, cumul_area, rows
+
+
+""" Pack the presents of the table from row rows on, in layers, starting with the open layer
+(cumul_area is the area added to it, added_present is True if it has presents) on top of prev_layer,
+until the presents are over or max_layers layers are packed (no limit if None).
+Layers are packed by pipeline if given (see LayerPipeline), with a checkpoint every checkpoint_layers layers.
+Returns the last layer. """
+def pack_table(table, layer, prev_layer=None, cumul_area=0, rows=0, added_present=False,
+               pool=None, pipeline=None, checkpoint_layers=0, max_layers=MAX_LAYERS):
+   for [row, id, width, height, z_depth, area] in table.iter_presents(rows):
+      rows += 1
+      if id%10000 == 0:
+        print id
+
+      added_present = False
+      if cumul_area + area < SLEIGH_LENGTH*SLEIGH_LENGTH:
+         cumul_area += area
+         with stats.timer('add_present'):
+            added_present = layer.add_present(row, z_depth) 
+
+      if not added_present:
+#            print "Full layer!"
+         # area is full! try to pack! return presents that do not fit
+         if pipeline is None:
+            leftovers = finish_layer(layer, prev_layer, pool)
          else:
-            self.child[0].xpos = self.xpos
-            self.child[0].ypos = self.ypos
-            self.child[0].width = self.width 
-            self.child[0].height = present.height
-            
-            self.child[1].xpos = self.xpos
-            self.child[1].ypos = self.ypos - present.height
-            self.child[1].width = self.width 
-            self.child[1].height = self.height - present.height
-
-         # insert in first child
-         return self.child[0].insert(present)
-
-
+            leftovers = pipeline.pack(layer)
+#            print "Leftovers",len(leftovers)
+         #print layer.id, id, float(id)/layer.id
+
+         # open new shelf and add current present
+         cumul_area = int(table.area[leftovers].sum())
+         prev_layer = layer
+         if max_layers and layer.id >= max_layers:
+            break
+         layer = Layer(prev_layer.id+1, prev_layer.z_max+1, table, leftovers)
+         with stats.timer('add_present'):
+            added_present = layer.add_present(row, z_depth)
+         if checkpoint_layers and prev_layer.id % checkpoint_layers == 0:
+            if pipeline is not None:
+               # the checkpoint needs prev_layer compacted
+               pipeline.finish()
+               layer.rebase(prev_layer.z_max+1)
+            save_checkpoint(CHECKPOINT_FILE, table, layer, prev_layer, cumul_area, rows)
+
+      if not added_present:
+         print "Something wrong"
+
+   if added_present == True:
+      # rows are over. 
+      # last layer was not "full" (area-wise), so it has not been packed yet!
+      # however, it can still have leftovers, packed in new layers
+      while True:
+         if pipeline is None:
+            leftovers = finish_layer(layer, prev_layer, pool)
+         else:
+            leftovers = pipeline.pack(layer)
+         if len(leftovers) == 0:
+            break
+         prev_layer = layer
+         layer = Layer(prev_layer.id+1, prev_layer.z_max+1, table, leftovers)
+   if pipeline is not None:
+      pipeline.close()
+   return layer
 
 
 if __name__ == "__main__":
     
    path = '.'
-   presentsFilename = os.path.join(path, 'presents.csv')
+   binary = '--binary' in sys.argv[1:]
+   if '--stats' in sys.argv[1:]:
+      stats.enabled = True
+   if '--engine' in sys.argv[1:]:
+      PACKING_ENGINE = sys.argv[sys.argv.index('--engine') + 1]
+      if PACKING_ENGINE not in ENGINES:
+         print "Unknown engine " + PACKING_ENGINE + ", expected one of " + ", ".join(ENGINES)
+         exit()
+   # the portfolio engine packs each layer in several ways, in parallel with --jobs N
+   pool = None
+   if '--jobs' in sys.argv[1:] and PACKING_ENGINE == 'portfolio':
+      pool = multiprocessing.Pool(int(sys.argv[sys.argv.index('--jobs') + 1]))
+   presentsFilename = os.path.join(path, 'presents.npy' if binary else 'presents.csv')
    submissionFilename = os.path.join(path, 'test.csv')
-   
-   # create header for submission file: PresentId, x1,y1,z1, ... x8,y8,z8
-   header = ['PresentId']
-   for i in xrange(1,9):
-       header += ['x' + str(i), 'y' + str(i), 'z' + str(i)]
+   if '--gzip' in sys.argv[1:]:
+      submissionFilename += '.gz'
     
-   layer = Layer(1,1,[])
-   prev_layer = None
-   maxz = 1
-   with open(presentsFilename, 'rb') as f:
-      f.readline() # header
-      fcsv = csv.reader(f)
+   # anytime packing, with a time budget per layer or for the run (see TimeBudget)
+   layer_seconds = run_seconds = None
+   if '--budget' in sys.argv[1:]:
+      layer_seconds = float(sys.argv[sys.argv.index('--budget') + 1])
+   if '--run-budget' in sys.argv[1:]:
+      run_seconds = float(sys.argv[sys.argv.index('--run-budget') + 1])
+   if layer_seconds is not None or run_seconds is not None:
+      if PACKING_ENGINE == 'portfolio' or '--pipeline' in sys.argv[1:]:
+         print "--budget and --run-budget work with the guillotine, maxrects and skyline engines, without --pipeline"
+         exit()
+
+   # by default, the run stops after MAX_LAYERS layers and writes nothing (see WRITE):
+   # --max-layers N changes the limit (0 for none), --write writes the submission
+   max_layers = MAX_LAYERS
+   if '--max-layers' in sys.argv[1:]:
+      max_layers = int(sys.argv[sys.argv.index('--max-layers') + 1])
+   if '--write' in sys.argv[1:]:
+      WRITE = True
+
+   checkpoint_layers = 0
+   if '--checkpoint' in sys.argv[1:]:
+      checkpoint_layers = int(sys.argv[sys.argv.index('--checkpoint') + 1])
+
+   # presents as columns; placements are recorded layer by layer and written once maxz is known
+   with stats.timer('parse'):
+      table = PresentTable.from_file(presentsFilename)
+   if '--resume' in sys.argv[1:]:
+      layer, prev_layer, cumul_area, rows = load_checkpoint(CHECKPOINT_FILE, table)
+      added_present = True
+      print "Resuming at layer", layer.id, "after", rows, "presents"
+   else:
+      layer = Layer(1,1,table,[])
+      prev_layer = None
       cumul_area = 0
-      for row in fcsv:
-         if int(row[0])%10000 == 0:
-           print row[0]
-
-         present = Present(row)
-         
-         added_present = False
-         if cumul_area + present.area < SLEIGH_LENGTH*SLEIGH_LENGTH:
-            cumul_area += present.area
-            added_present = layer.add_present(present) 
-         
-         if not added_present:
-#            print "Full layer!"
-            # area is full! try to pack! return presents that do not fit
-            leftovers = layer.pack()
-#            print "Leftovers",len(leftovers)
-#            print sum(p.area for p in layer.presents)/float(SLEIGH_LENGTH*SLEIGH_LENGTH)
-            #print layer.id, present.id, float(present.id)/layer.id
-            if layer.id % 2 == 0:
-               layer.reflect_shelf()
-            
-            # compact shelf down (if possible), preserving order
-            if prev_layer is not None:
-               layer.compact(prev_layer)
-            
-            # store coordinates for plotting
-            if PLOT:
-               layer.finalize_shelf()
-            
-            # open new shelf and add current present
-            cumul_area = sum(p.area for p in leftovers)
-            prev_layer = layer
-            if layer.id >= MAX_LAYERS:
-               break
-            layer = Layer(prev_layer.id+1, prev_layer.z_max+1, leftovers)
-            added_present = layer.add_present(present)
-
-         if not added_present:
-            print "Something wrong"
-
+      rows = 0 # presents read
+      added_present = False
+   if layer_seconds is not None or run_seconds is not None:
+      recorded = np.frombuffer(table.recorded, dtype=np.int32)
+      BUDGET = TimeBudget(layer_seconds, run_seconds,
+                          int(table.area.sum(dtype=np.int64)) - int(table.area[recorded].sum(dtype=np.int64)))
+   # with --pipeline, packing overlaps the compaction of the previous layer (see LayerPipeline)
+   pipeline = None
+   if '--pipeline' in sys.argv[1:]:
+      pipeline = LayerPipeline(prev_layer)
+   layer = pack_table(table, layer, prev_layer, cumul_area, rows, added_present,
+                      pool=pool, pipeline=pipeline, checkpoint_layers=checkpoint_layers, max_layers=max_layers)
+   if pool is not None:
+      pool.close()
+      pool.join()
    maxz = layer.z_max
 
    print "Max z =", maxz
@@ -566,62 +993,12 @@ if __name__ == "__main__":
 
    if WRITE:
       print "Writing file"
-      layer = Layer(1,1,[])
-      prev_layer = None
-      with open(presentsFilename, 'rb') as f:
-         with open(submissionFilename, 'wb') as w:
-            f.readline() # header
-            fcsv = csv.reader(f)
-            wcsv = csv.writer(w)
-            wcsv.writerow(header)
-            
-            cumul_area = 0
-            for row in fcsv:
-               if int(row[0])%10000 == 0:
-                 print row[0]
-
-               present = Present(row)
-               
-               added_present = False
-               if cumul_area + present.area < SLEIGH_LENGTH*SLEIGH_LENGTH:
-                  cumul_area += present.area
-                  added_present = layer.add_present(present) 
-               
-               if not added_present:
-                  leftovers = layer.pack()
-
-                  #print layer.id, present.id, float(present.id)/layer.id
-                  if layer.id % 2 == 0:
-                     layer.reflect_shelf()
-
-                  # compact shelf down (if possible), preserving order 
-                  if prev_layer is not None:
-                     layer.compact(prev_layer)
-                  
-                  # write to file
-                  layer.write_shelf(wcsv, maxz)
-                  
-                  # open new shelf and add current present
-                  cumul_area = sum(p.area for p in leftovers)
-                  prev_layer = layer
-                  if layer.id >= MAX_LAYERS:
-                     break
-                  layer = Layer(prev_layer.id+1, prev_layer.z_max+1, leftovers)
-                  added_present = layer.add_present(present)
-
-               if not added_present:
-                  print "Something wrong"
-            
-            if added_present == True:
-               # rows are over. 
-               # last layer was not "full" (area-wise), so it has not been packed yet!
-               leftovers = layer.pack()
-               layer.write_shelf(wcsv,maxz)
-               #however, it can still have leftovers
-               if len(leftovers)>0: 
-                  prev_layer = layer
-                  layer = Layer(prev_layer.id+1, prev_layer.z_max+1, leftovers)
-                  layer.write_shelf(wcsv,maxz)
+      with SubmissionWriter(submissionFilename, background=pipeline is not None) as writer:
+         with stats.timer('write_shelf'):
+            table.write(writer, maxz)
+
+   if stats.enabled:
+      stats.save(sys.argv[sys.argv.index('--stats') + 1])
 
 
    print 'Done'
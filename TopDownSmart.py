@@ -8,7 +8,11 @@ Approach:
 """
 
 import os
-import csv
+import sys
+
+import PresentsLoader
+from PlacementBuffer import PlacementBuffer
+from SubmissionWriter import SubmissionWriter
 
 SLEIGH_LENGTH = 1000
 xpos, ypos, zpos, dx, dy, dz = [],[],[],[],[],[]
@@ -76,8 +80,14 @@ def simple_packing(cursor, present):
     return [x1, x2, y1, y2, z1, z2]
 
 
-def fake_pack_present(cursor, present):
+def record_present(cursor, present, placements):
+    """ Packs the present and records its placement, to be written with z flipped
+    once maxz is known.
+    Returns:
+        z2, the top of the present
+    """
     [x1, x2, y1, y2, z1, z2] = simple_packing(cursor, present)
+    placements.append(int(present[0]), x1, x2, y1, y2, z2, z1)
     if z1 <= 300:
        print z1,z2 
        xpos.append(min(x1,x2))
@@ -89,36 +99,6 @@ def fake_pack_present(cursor, present):
     
     return z2    
 
-def pack_present(cursor, present, maxz):
-    """ 
-    Vertex convention: x1 y1 z1
-                       x1 y2 z1
-                       x2 y1 z1
-                       x2 y2 z1
-                       x1 y1 z2
-                       x1 y2 z2
-                       x2 y1 z2
-                       x2 y2 z2
-    Arguments:
-        sleigh: 3D tensor representing the sleigh
-        present: row from the present file: id, length_x, length_y, length_z
-    Returns:
-        list_vertices: list of the 8 vertices of the packed present
-    """
-    [x1, x2, y1, y2, z2, z1] = simple_packing(cursor, present)
-    z1 = maxz - z1 + 1
-    z2 = maxz - z2 + 1
-
-    list_vertices = [x1, y1, z1]
-    list_vertices += [x1, y2, z1]
-    list_vertices += [x2, y1, z1]
-    list_vertices += [x2, y2, z1]
-    list_vertices += [x1, y1, z2]
-    list_vertices += [x1, y2, z2]
-    list_vertices += [x2, y1, z2]
-    list_vertices += [x2, y2, z2]
-    return list_vertices    
-
 class Cursor:
     """ Object to keep track of present position and max extent in sleigh so far. """    
     def __init__(self):
@@ -134,21 +114,17 @@ class Cursor:
 if __name__ == "__main__":
     
     path = '.'
-    presentsFilename = os.path.join(path, 'presents.csv')
+    binary = '--binary' in sys.argv[1:]
+    presentsFilename = os.path.join(path, 'presents.npy' if binary else 'presents.csv')
     submissionFilename = os.path.join(path, 'topdown.csv')
-    
-    # create header for submission file: PresentId, x1,y1,z1, ... x8,y8,z8
-    header = ['PresentId']
-    for i in xrange(1,9):
-        header += ['x' + str(i), 'y' + str(i), 'z' + str(i)]
+    if '--gzip' in sys.argv[1:]:
+        submissionFilename += '.gz'
      
     myCursor = Cursor()
-    with open(presentsFilename, 'rb') as f:
-            f.readline() # header
-            fcsv = csv.reader(f)
-            maxz = 1
-            for row in fcsv:
-                maxz = max(maxz,fake_pack_present(myCursor, row))
+    placements = PlacementBuffer()
+    maxz = 1
+    for row in PresentsLoader.read_presents_rows(presentsFilename):
+        maxz = max(maxz,record_present(myCursor, row, placements))
     
     print "Max z =", maxz
    
@@ -163,15 +139,8 @@ if __name__ == "__main__":
     plt.show()
 
     print "Writing file"
-    myCursor = Cursor()
-    with open(presentsFilename, 'rb') as f:
-        with open(submissionFilename, 'wb') as w:
-            f.readline() # header
-            fcsv = csv.reader(f)
-            wcsv = csv.writer(w)
-            wcsv.writerow(header)
-            for row in fcsv:
-                wcsv.writerow([row[0]] + pack_present(myCursor, row, maxz))
+    with SubmissionWriter(submissionFilename) as writer:
+        placements.write(writer, maxz)
 
 
     print 'Done'
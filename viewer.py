@@ -4,6 +4,8 @@ Packing Santa's Sleigh -- Submission 3d viewer
 
 import os, sys
 import csv
+
+import BinaryFormat
 from matplotlib import cm
 import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
@@ -18,14 +20,30 @@ colors = []
 if __name__ == "__main__":
     
    path = '.'
+   binary = '--binary' in sys.argv[1:]
+   args = [a for a in sys.argv[1:] if a != '--binary']
    presentsFilename = os.path.join(path, 'presents.csv')
-   submissionFilename = os.path.join(path, sys.argv[1])
-   if len(sys.argv) > 2:
-      max_row = int(sys.argv[2])
+   submissionFilename = os.path.join(path, args[0])
+   if len(args) > 1:
+      max_row = int(args[1])
    else:
       max_row = MAX_ROW
    z_layer = 0
-   with open(submissionFilename, 'rb') as f:
+   if binary:
+      # binary submission: min and max corners of the presents with id < max_row
+      placements = BinaryFormat.load_placements(submissionFilename)
+      placements = placements[placements['id'] < max_row]
+      for i, x1, x2, y1, y2, z1, z2 in zip(*[placements[name].tolist() for name in
+                                             ['id', 'x1', 'x2', 'y1', 'y2', 'z1', 'z2']]):
+         xpos.append(x1)
+         ypos.append(y1)
+         zpos.append(z1)
+         dx.append(x2 - x1)
+         dy.append(y2 - y1)
+         dz.append(z2 - z1)
+         colors.append(cm.jet(float(i)/max_row))
+   else:
+      with open(submissionFilename, 'rb') as f:
             f.readline() # header
             fcsv = csv.reader(f)
             for row in fcsv: